@@ -0,0 +1,98 @@
+import base64
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+# Accept type a client sends to get compressed JSON, and the only entry in the APIs'
+# BinaryMediaTypes. API Gateway decodes a base64 response only for a request whose Accept
+# matches a binary media type, and a type requests also send as Content-Type would get
+# their bodies base64-encoded on the way in, so it is one no request body uses.
+COMPRESSED_MEDIA_TYPE = 'application/vnd.flexistore+json'
+
+
+def get_header(event, name):
+    """Look up a request header case-insensitively."""
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+
+def get_body(event):
+    """Return the request body as text, decoding it if API Gateway base64-encoded it."""
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+    return body
+
+
+def choose_encoding(accept_encoding):
+    """Pick the best content coding we support from an Accept-Encoding header."""
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    supported = ['br', 'gzip'] if brotli is not None else ['gzip']
+    candidates = [(weights.get(coding, weights.get('*', 0.0)), -rank, coding)
+                  for rank, coding in enumerate(supported)]
+    weight, _, coding = max(candidates)
+    return coding if weight > 0 else None
+
+
+def accepts_compressed(accept):
+    """Check that the first media range of an Accept header is COMPRESSED_MEDIA_TYPE.
+
+    API Gateway matches binary media types against that first range only.
+    """
+    if not accept:
+        return False
+    return accept.split(',')[0].split(';')[0].strip().lower() == COMPRESSED_MEDIA_TYPE
+
+
+def compress_response(response, accept_encoding, accept=None):
+    """Compress a Lambda proxy response body when the client accepts it and it is big enough.
+
+    Compressed bodies are returned base64-encoded with isBase64Encoded set, which API
+    Gateway only turns back into bytes for an Accept of COMPRESSED_MEDIA_TYPE, so any
+    other request gets the body uncompressed.
+    """
+    body = response.get('body')
+    response.setdefault('isBase64Encoded', False)
+    if not body or response['isBase64Encoded']:
+        return response
+
+    headers = response.setdefault('headers', {})
+    headers['Vary'] = 'Accept, Accept-Encoding'
+    data = body.encode('utf-8')
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return response
+
+    encoding = choose_encoding(accept_encoding) if accepts_compressed(accept) else None
+    if encoding == 'br':
+        compressed = brotli.compress(data, quality=5)
+    elif encoding == 'gzip':
+        compressed = gzip.compress(data, compresslevel=6)
+    else:
+        return response
+
+    response['body'] = base64.b64encode(compressed).decode('ascii')
+    response['isBase64Encoded'] = True
+    headers['Content-Encoding'] = encoding
+    return response
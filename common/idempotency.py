@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import time
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+from http_utils import get_header, get_body
+
+IDEMPOTENCY_TABLE = os.getenv('IDEMPOTENCY_TABLE', None)
+# How long a completed response is replayed for, and how long an unfinished request
+# holds its key before a retry may take over (longer than the function timeout)
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', 24 * 60 * 60))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', 120))
+MAX_KEY_LENGTH = 255
+
+IN_PROGRESS = 'IN_PROGRESS'
+COMPLETED = 'COMPLETED'
+
+dynamodb = boto3.resource('dynamodb')
+idempotency_table = dynamodb.Table(IDEMPOTENCY_TABLE)
+deserializer = TypeDeserializer()
+
+
+def idempotent(event, handler, create_response):
+    """Run a write handler at most once per Idempotency-Key header.
+
+    The first request claims the key with a conditional put and its response is stored.
+    A retry with the same key and body gets that response replayed, a retry while the
+    first is still running gets 409, and reusing a key for a different body gets 422.
+    Requests without the header are handled as before.
+    """
+    key = get_header(event, 'Idempotency-Key')
+    if not key:
+        return handler(event)
+    if len(key) > MAX_KEY_LENGTH:
+        return create_response(400, {'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'})
+
+    record_key = {'idempotency_key': f"{event['httpMethod']} {event['resource']} {key}"}
+    payload_hash = hashlib.sha256(get_body(event).encode('utf-8')).hexdigest()
+    now = int(time.time())
+    try:
+        idempotency_table.put_item(
+            Item=dict(record_key, status=IN_PROGRESS, payload_hash=payload_hash,
+                      locked_until=now + IDEMPOTENCY_LOCK_SECONDS, expires_at=now + IDEMPOTENCY_TTL_SECONDS),
+            # TTL deletion lags, so an expired record or an abandoned lock counts as free
+            ConditionExpression='attribute_not_exists(idempotency_key) OR expires_at < :now '
+                                'OR (#status = :in_progress AND locked_until < :now)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':now': now, ':in_progress': IN_PROGRESS},
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        record = {name: deserializer.deserialize(value) for name, value in e.response.get('Item', {}).items()}
+        if record.get('payload_hash') != payload_hash:
+            return create_response(422, {'error': 'Idempotency-Key was already used with a different request body'})
+        if record.get('status') != COMPLETED:
+            return create_response(409, {'error': 'A request with this Idempotency-Key is still in progress'})
+        response = json.loads(record['response'])
+        response['headers']['Idempotent-Replayed'] = 'true'
+        return response
+
+    try:
+        response = handler(event)
+    except Exception:
+        idempotency_table.delete_item(Key=record_key)
+        raise
+    if response['statusCode'] >= 500:
+        # Let a retry run the request again rather than replaying a server error
+        idempotency_table.delete_item(Key=record_key)
+    else:
+        idempotency_table.update_item(
+            Key=record_key,
+            UpdateExpression='SET #status = :completed, #response = :response',
+            ExpressionAttributeNames={'#status': 'status', '#response': 'response'},
+            ExpressionAttributeValues={':completed': COMPLETED, ':response': json.dumps(response)}
+        )
+    return response
@@ -0,0 +1,18 @@
+import decimal
+import json
+
+
+class DecimalEncoder(json.JSONEncoder):
+    """JSON encoder that writes DynamoDB Decimals as plain numbers while serializing.
+
+    Integral values stay integers (a price of 50 is written as 50, not 50.0) and the rest
+    become floats. Number and string sets are written as lists. The value being encoded
+    is never copied first, so large scans are walked exactly once.
+    """
+
+    def default(self, o):
+        if isinstance(o, decimal.Decimal):
+            return int(o) if o == o.to_integral_value() else float(o)
+        if isinstance(o, (set, frozenset)):
+            return list(o)
+        return super().default(o)
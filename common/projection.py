@@ -0,0 +1,41 @@
+import re
+
+FIELD_NAME_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+MAX_FIELDS = 50
+
+
+def parse_fields(query_params):
+    """Parse a comma-separated ?fields= list into attribute names, or None when absent."""
+    raw = (query_params or {}).get('fields')
+    if not raw:
+        return None
+
+    fields = []
+    for field in raw.split(','):
+        field = field.strip()
+        if not FIELD_NAME_PATTERN.match(field):
+            raise ValueError(f"Invalid field name: {field!r}")
+        if field not in fields:
+            fields.append(field)
+    if len(fields) > MAX_FIELDS:
+        raise ValueError(f"At most {MAX_FIELDS} fields can be requested")
+    return fields
+
+
+def build_projection(fields):
+    """Turn attribute names into ProjectionExpression parameters.
+
+    Every name goes through a #f placeholder, so reserved words such as type and
+    location need no special handling. The placeholders are merged with any that
+    boto3 generates for Key/Attr conditions in the same request.
+    """
+    names = {f"#f{i}": field for i, field in enumerate(fields)}
+    return {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names
+    }
+
+
+def project_item(item, fields):
+    """Apply a projection to an item that is already in memory."""
+    return {field: item[field] for field in fields if field in item}
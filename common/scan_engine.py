@@ -0,0 +1,103 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+
+SCAN_SEGMENTS = int(os.getenv('SCAN_SEGMENTS', 4))
+SCAN_BUFFER_ITEMS = int(os.getenv('SCAN_BUFFER_ITEMS', 1000))
+# Threads shared by every parallel_scan and concurrent_map call; segments past this
+# many wait for a free worker
+DYNAMODB_WORKERS = int(os.getenv('DYNAMODB_WORKERS', 12))
+
+_SEGMENT_DONE = object()
+
+# The worker threads outlive a single call, so the DynamoDB resources they build are
+# reused by later invocations of a warm container instead of being built every time
+_workers = ThreadPoolExecutor(max_workers=DYNAMODB_WORKERS, thread_name_prefix='dynamodb')
+_thread_state = threading.local()
+
+
+def thread_table(table):
+    """The calling thread's own copy of a boto3 Table.
+
+    boto3 resources are not thread-safe, so workers never call the table they were
+    handed. Each thread builds its own from a session of its own, once per table.
+    """
+    tables = getattr(_thread_state, 'tables', None)
+    if tables is None:
+        tables = _thread_state.tables = {}
+    if table.name not in tables:
+        tables[table.name] = boto3.session.Session().resource('dynamodb').Table(table.name)
+    return tables[table.name]
+
+
+def concurrent_map(function, items):
+    """Call function on every item on the shared worker threads; results keep their order.
+
+    function runs on a worker thread, so it must use thread_table() for DynamoDB.
+    """
+    return list(_workers.map(function, items))
+
+
+class _SegmentError:
+    """Wraps an exception raised by a segment worker so the consumer can re-raise it."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def parallel_scan(table, total_segments=SCAN_SEGMENTS, max_buffered_items=SCAN_BUFFER_ITEMS, **scan_params):
+    """Scan a table as total_segments concurrent segments and yield every item.
+
+    Each worker follows LastEvaluatedKey through its own segment, so the whole table is
+    read instead of the first 1 MB page. Items are handed over through a bounded queue:
+    once max_buffered_items are waiting, workers block until the caller catches up, so
+    memory stays capped however large the table is. Closing the generator early stops
+    the workers. Extra keyword arguments are passed to every scan call. Workers read
+    through their own thread_table(), never through table itself.
+    """
+    buffer = queue.Queue(maxsize=max_buffered_items)
+    stop = threading.Event()
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan_segment(segment):
+        params = dict(scan_params, Segment=segment, TotalSegments=total_segments)
+        try:
+            segment_table = thread_table(table)
+            while not stop.is_set():
+                response = segment_table.scan(**params)
+                for item in response.get('Items', []):
+                    if not put(item):
+                        return
+                if 'LastEvaluatedKey' not in response:
+                    break
+                params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        except Exception as e:
+            put(_SegmentError(e))
+        finally:
+            put(_SEGMENT_DONE)
+
+    try:
+        for segment in range(total_segments):
+            _workers.submit(scan_segment, segment)
+
+        finished = 0
+        while finished < total_segments:
+            entry = buffer.get()
+            if entry is _SEGMENT_DONE:
+                finished += 1
+            elif isinstance(entry, _SegmentError):
+                raise entry.error
+            else:
+                yield entry
+    finally:
+        stop.set()
@@ -0,0 +1,29 @@
+import boto3
+import sys
+
+""" One-off script that adds the location_type attribute used by LocationTypeIndex
+to facilities created before the search indexes existed.
+Usage: python backfill_location_type.py <facilities table name> """
+
+table_name = sys.argv[1]
+table = boto3.resource('dynamodb').Table(table_name)
+
+scan_params = {'ProjectionExpression': 'facility_id, #location, #type, location_type',
+               'ExpressionAttributeNames': {'#location': 'location', '#type': 'type'}}
+updated = 0
+while True:
+    response = table.scan(**scan_params)
+    for facility in response.get('Items', []):
+        if 'location_type' in facility or 'location' not in facility or 'type' not in facility:
+            continue
+        table.update_item(
+            Key={'facility_id': facility['facility_id']},
+            UpdateExpression='SET location_type = :location_type',
+            ExpressionAttributeValues={':location_type': f"{facility['location']}#{facility['type']}"}
+        )
+        updated += 1
+    if 'LastEvaluatedKey' not in response:
+        break
+    scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+print(f"Backfilled location_type on {updated} facilities")
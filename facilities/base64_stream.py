@@ -0,0 +1,59 @@
+import base64
+import io
+
+""" Incremental base64 decoding, so a large image sent base64 encoded in a JSON body can
+be hashed and streamed to S3 without ever holding the decoded bytes in memory at once. """
+
+# Characters decoded per step; a multiple of 4 so steps line up with base64 quanta
+DECODE_CHUNK_CHARS = 64 * 1024
+WHITESPACE = str.maketrans('', '', ' \t\r\n')
+
+
+class Base64Reader(io.RawIOBase):
+    """Read-only file object over the decoded bytes of a base64 string."""
+
+    def __init__(self, data, chunk_chars=DECODE_CHUNK_CHARS):
+        self.data = data
+        self.chunk_chars = chunk_chars
+        self.position = 0
+        self.pending = ''
+        self.buffer = bytearray()
+
+    def readable(self):
+        return True
+
+    def _decode_next_chunk(self):
+        """Decode the next slice of the string into the buffer; False once it is used up."""
+        if self.position >= len(self.data):
+            return False
+        chunk = self.pending + self.data[self.position:self.position + self.chunk_chars].translate(WHITESPACE)
+        self.position += self.chunk_chars
+        # Hold back an incomplete quantum until the next slice, or until the end
+        usable = len(chunk) if self.position >= len(self.data) else len(chunk) - len(chunk) % 4
+        self.pending = chunk[usable:]
+        self.buffer += base64.b64decode(chunk[:usable])
+        return True
+
+    def read(self, size=-1):
+        while (size is None or size < 0 or len(self.buffer) < size) and self._decode_next_chunk():
+            pass
+        if size is None or size < 0:
+            size = len(self.buffer)
+        result = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return result
+
+    def readinto(self, target):
+        data = self.read(len(target))
+        target[:len(data)] = data
+        return len(data)
+
+
+def iter_decoded(data, chunk_size=DECODE_CHUNK_CHARS):
+    """Yield the decoded bytes of a base64 string a chunk at a time."""
+    reader = Base64Reader(data)
+    while True:
+        chunk = reader.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import time
+from bisect import bisect_right
+from collections import Counter
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+""" Facet counts (per location, per type and per price band) for the filter form.
+The counts live in a single aggregates item in the catalog meta table, kept up to
+date by a DynamoDB Streams consumer with atomic ADD updates, so reading them is one
+GetItem however large the catalog grows. seed_facets.py recounts them from scratch if
+they ever need reconciling. """
+
+CATALOG_META_TABLE = os.environ.get('CATALOG_META_TABLE')
+FACETS_ID = 'facets'
+FACET_DIMENSIONS = ('location', 'type', 'price_band')
+TOTAL_ATTRIBUTE = 'total'
+# Marker items recording which stream batches were applied; they only need to outlive
+# the stream's 24 hour retention, after which the batch can no longer be retried
+BATCH_MARKER_PREFIX = 'facets-batch#'
+BATCH_MARKER_TTL_SECONDS = 2 * 24 * 60 * 60
+# Lower bound of each price band; the last band is open ended
+PRICE_BAND_EDGES = (0, 100, 250, 500, 1000, 2500, 5000)
+
+dynamodb = boto3.resource('dynamodb')
+deserializer = TypeDeserializer()
+
+def price_band(price):
+    """Label of the price band a price falls into, e.g. '100-249' or '5000+'."""
+    index = max(bisect_right(PRICE_BAND_EDGES, price) - 1, 0)
+    if index == len(PRICE_BAND_EDGES) - 1:
+        return f"{PRICE_BAND_EDGES[index]}+"
+    return f"{PRICE_BAND_EDGES[index]}-{PRICE_BAND_EDGES[index + 1] - 1}"
+
+def facet_attributes(facility):
+    """Names of the counter attributes a facility contributes to, e.g. 'location|Durban'."""
+    values = {
+        'location': facility.get('location'),
+        'type': facility.get('type'),
+        'price_band': price_band(facility['price']) if facility.get('price') is not None else None
+    }
+    return [f"{dimension}|{value}" for dimension, value in values.items() if value is not None]
+
+def facet_deltas(records):
+    """Net change to every counter for a batch of stream records.
+
+    Inserts count up, removes count down and a modify moves the facility between
+    counters; changes that cancel out within the batch are dropped.
+    """
+    deltas = Counter()
+    for record in records:
+        images = record['dynamodb']
+        if 'OldImage' in images:
+            old = {name: deserializer.deserialize(value) for name, value in images['OldImage'].items()}
+            deltas.update({name: -1 for name in facet_attributes(old) + [TOTAL_ATTRIBUTE]})
+        if 'NewImage' in images:
+            new = {name: deserializer.deserialize(value) for name, value in images['NewImage'].items()}
+            deltas.update({name: 1 for name in facet_attributes(new) + [TOTAL_ATTRIBUTE]})
+    return {name: delta for name, delta in deltas.items() if delta}
+
+def batch_id(records):
+    """Stable id for a batch of stream records, the same when Lambda retries the batch."""
+    event_ids = '\n'.join(record['eventID'] for record in records)
+    return hashlib.sha256(event_ids.encode('utf-8')).hexdigest()
+
+def apply_deltas(meta_table, deltas, applied_batch_id):
+    """Apply every counter change of a batch in one atomic ADD update, at most once.
+
+    The update runs in a transaction with a conditional put of a marker for the batch,
+    so a batch that Lambda retries after it was applied changes nothing.
+    """
+    if not deltas:
+        return
+    names = {}
+    values = {}
+    clauses = []
+    for index, (name, delta) in enumerate(sorted(deltas.items())):
+        names[f"#c{index}"] = name
+        values[f":c{index}"] = delta
+        clauses.append(f"#c{index} :c{index}")
+    marker = {'meta_id': BATCH_MARKER_PREFIX + applied_batch_id, 'expires_at': int(time.time()) + BATCH_MARKER_TTL_SECONDS}
+    try:
+        meta_table.meta.client.transact_write_items(TransactItems=[
+            {'Put': {'TableName': meta_table.name, 'Item': marker, 'ConditionExpression': 'attribute_not_exists(meta_id)'}},
+            {'Update': {'TableName': meta_table.name, 'Key': {'meta_id': FACETS_ID},
+                        'UpdateExpression': 'ADD ' + ', '.join(clauses),
+                        'ExpressionAttributeNames': names, 'ExpressionAttributeValues': values}}
+        ])
+    except ClientError as e:
+        reasons = e.response.get('CancellationReasons') or [{}]
+        if e.response['Error']['Code'] != 'TransactionCanceledException' or reasons[0].get('Code') != 'ConditionalCheckFailed':
+            raise
+        print(f"Facet counts for batch {applied_batch_id} were already applied")
+
+def read_facets(meta_table):
+    """Facet counts grouped by dimension, leaving out values whose count dropped to zero."""
+    item = meta_table.get_item(Key={'meta_id': FACETS_ID}).get('Item', {})
+    facets = {dimension: {} for dimension in FACET_DIMENSIONS}
+    for name, count in item.items():
+        dimension, _, value = name.partition('|')
+        if dimension in facets and count > 0:
+            facets[dimension][value] = int(count)
+    facets[TOTAL_ATTRIBUTE] = int(item.get(TOTAL_ATTRIBUTE, 0))
+    return facets
+
+def lambda_handler(event, context):
+    """DynamoDB Streams consumer for the facilities table."""
+    records = event['Records']
+    apply_deltas(dynamodb.Table(CATALOG_META_TABLE), facet_deltas(records), batch_id(records))
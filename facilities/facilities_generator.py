@@ -1,6 +1,6 @@
 import random
-import base64
 import uuid
+import hashlib
 import os
 import requests
 
@@ -12,12 +12,39 @@ warehouse_folder = "/home/luluma/AWS/capstone/jhb_2_cloud_capstone_project/facil
 
 api_url = "https://b9mdnewkzk.execute-api.eu-west-1.amazonaws.com/prod/facilities"
 
-def image_to_base64(image_path):
+# Approximate city centre coordinates, used to place facilities for the nearby search
+city_coordinates = {
+    "Johannesburg": (-26.2041, 28.0473), "Cape Town": (-33.9249, 18.4241),
+    "Durban": (-29.8587, 31.0218), "Pretoria": (-25.7479, 28.2293),
+    "Port Elizabeth": (-33.9608, 25.6022), "Bloemfontein": (-29.0852, 26.1596),
+    "East London": (-33.0292, 27.8546), "Polokwane": (-23.9045, 29.4689),
+    "Nelspruit": (-25.4753, 30.9694), "Kimberley": (-28.7282, 24.7499),
+    "Pietermaritzburg": (-29.6006, 30.3794), "George": (-33.9630, 22.4617),
+    "Rustenburg": (-25.6676, 27.2421), "Upington": (-28.4478, 21.2561),
+    "Vanderbijlpark": (-26.7116, 27.8380), "Welkom": (-27.9774, 26.7351),
+    "Mthatha": (-31.5889, 28.7844), "Kuruman": (-27.4524, 23.4325),
+    "Ladysmith": (-28.5539, 29.7784)
+}
+
+def random_coordinates(location):
+    """ Random point within a few kilometres of the city centre """
+    lat, lng = city_coordinates[location]
+    return round(lat + random.uniform(-0.05, 0.05), 6), round(lng + random.uniform(-0.05, 0.05), 6)
+
+def upload_image(image_path):
+    """ Upload an image straight to S3 with a presigned POST and return its object key.
+    Images are content-addressed, so one that is already in the bucket is not sent again """
     with open(image_path, "rb") as image_file:
         image_data = image_file.read()
-        return base64.b64encode(image_data).decode('utf-8')
+    digest = hashlib.sha256(image_data).hexdigest()
+    response = requests.post(f"{api_url}/upload-url", json={'content_type': 'image/jpeg', 'sha256': digest})
+    response.raise_for_status()
+    upload = response.json()
+    if not upload['exists']:
+        requests.post(upload['url'], data=upload['fields'], files={'file': image_data}).raise_for_status()
+    return upload['image_key']
 
-""" Functions to generate random facilities with base64 image"""
+""" Functions to generate random facilities with an uploaded image"""
 def generate_facility_locker():
     locker_facility_name = random.choice([
     "SecureVault", "EasyStore Locker", "SafeKeep Locker", "QuickLock", 
@@ -48,16 +75,20 @@ def generate_facility_locker():
     # Get a random image from the folder
     random_image_filename = random.choice(os.listdir(locker_folder))
     random_image_path = os.path.join(locker_folder, random_image_filename)
-    image_data = image_to_base64(random_image_path)
+    image_key = upload_image(random_image_path)
+
+    latitude, longitude = random_coordinates(location)
 
     facility = {
         'facility_name': locker_facility_name,
         'location': location,
+        'latitude': latitude,
+        'longitude': longitude,
         'type': facility_type,
         'capacity': capacity,
         'price': price,
         'description': description,
-        'image': image_data  # base64 encoded image data
+        'image_key': image_key  # already uploaded to S3
     }
     return facility
 
@@ -93,16 +124,20 @@ def generate_facility_garage():
     # Get a random image from the folder
     random_image_filename = random.choice(os.listdir(garage_forlder))
     random_image_path = os.path.join(garage_forlder, random_image_filename)
-    image_data = image_to_base64(random_image_path)
+    image_key = upload_image(random_image_path)
+
+    latitude, longitude = random_coordinates(location)
 
     facility = {
         'facility_name': garage_facility_name,
         'location': location,
+        'latitude': latitude,
+        'longitude': longitude,
         'type': facility_type,
         'capacity': capacity,
         'price': price,
         'description': description,
-        'image': image_data  # base64 encoded image data
+        'image_key': image_key  # already uploaded to S3
     }
     return facility
 
@@ -138,16 +173,20 @@ def generate_facility_storage_unit():
     # Get a random image from the folder
     random_image_filename = random.choice(os.listdir(storage_unit_folder))
     random_image_path = os.path.join(storage_unit_folder, random_image_filename)
-    image_data = image_to_base64(random_image_path)
+    image_key = upload_image(random_image_path)
+
+    latitude, longitude = random_coordinates(location)
 
     facility = {
         'facility_name': storage_unit_facility_name,
         'location': location,
+        'latitude': latitude,
+        'longitude': longitude,
         'type': facility_type,
         'capacity': capacity,
         'price': price,
         'description': description,
-        'image': image_data  # base64 encoded image data
+        'image_key': image_key  # already uploaded to S3
     }
     return facility
 
@@ -185,16 +224,20 @@ def generate_facility_warehouse():
     # Get a random image from the folder
     random_image_filename = random.choice(os.listdir(warehouse_folder))
     random_image_path = os.path.join(warehouse_folder, random_image_filename)
-    image_data = image_to_base64(random_image_path)
+    image_key = upload_image(random_image_path)
+
+    latitude, longitude = random_coordinates(location)
 
     facility = {
         'facility_name': warehouse_facility_name,
         'location': location,
+        'latitude': latitude,
+        'longitude': longitude,
         'type': facility_type,
         'capacity': capacity,
         'price': price,
         'description': description,
-        'image': image_data  # base64 encoded image data
+        'image_key': image_key  # already uploaded to S3
     }
     return facility
 
@@ -0,0 +1,78 @@
+import math
+
+""" Geohash encoding and the cell arithmetic used by the nearby search. """
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+
+def encode(lat, lng, precision):
+    """Encode a coordinate as a geohash of the given length."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, bounds = (lng, lng_range) if even else (lat, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            bounds[0] = middle
+        else:
+            bits = bits * 2
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Height and width, in degrees, of a geohash cell of the given length."""
+    lng_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def bounding_box(lat, lng, radius_km):
+    """Latitude/longitude box that contains every point within radius_km."""
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    lng_delta = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    return (max(lat - lat_delta, -90.0), min(lat + lat_delta, 90.0),
+            max(lng - lng_delta, -180.0), min(lng + lng_delta, 180.0))
+
+
+def covering_cells(lat, lng, radius_km, precision):
+    """Geohash cells of the given length that together cover a circle.
+
+    Samples the bounding box one cell apart in each direction, so every cell that
+    overlaps the box contains a sample point.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    cell_lat, cell_lng = cell_size(precision)
+    lat_steps = int((max_lat - min_lat) / cell_lat) + 2
+    lng_steps = int((max_lng - min_lng) / cell_lng) + 2
+
+    cells = set()
+    for i in range(lat_steps):
+        sample_lat = min(min_lat + i * cell_lat, max_lat)
+        for j in range(lng_steps):
+            sample_lng = min(min_lng + j * cell_lng, max_lng)
+            cells.add(encode(sample_lat, sample_lng, precision))
+    return cells
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two coordinates (haversine)."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
@@ -0,0 +1,76 @@
+import json
+import os
+import time
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+""" SQS worker that reclaims the S3 images of deleted facilities. Deletes queue the image
+keys of the facilities they removed; this worker drains them in batches, keeps any image
+another facility still uses (images are content-addressed and shared), and removes the
+rest together with their derivatives using DeleteObjects. Messages arrive delayed, and an
+image written or referenced again within IMAGE_CLEANUP_GRACE_SECONDS is kept, since a
+facility using it may not be visible in ImageKeyIndex yet. """
+
+FACILITIES_TABLE = os.getenv('FACILITIES_TABLE', None)
+S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME', None)
+# Same layout as storage_facilities.DERIVATIVES_PREFIX and image_processor
+DERIVATIVES_PREFIX = 'derivatives/'
+DELETE_OBJECTS_BATCH_SIZE = 1000
+IMAGE_CLEANUP_GRACE_SECONDS = int(os.getenv('IMAGE_CLEANUP_GRACE_SECONDS', 900))
+# Same as storage_facilities.LAST_REFERENCED_METADATA
+LAST_REFERENCED_METADATA = 'last-referenced'
+
+s3 = boto3.client('s3')
+dynamodb = boto3.resource('dynamodb')
+table = dynamodb.Table(FACILITIES_TABLE)
+
+def is_referenced(image_key):
+    """Whether any facility still uses the image, through the KEYS_ONLY ImageKeyIndex."""
+    response = table.query(IndexName='ImageKeyIndex', KeyConditionExpression=Key('image_key').eq(image_key), Limit=1)
+    return bool(response.get('Items'))
+
+def recently_used(image_key):
+    """Whether the image was written or referenced again within the grace period."""
+    try:
+        head = s3.head_object(Bucket=S3_BUCKET_NAME, Key=image_key)
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+            raise
+        # Already gone; its derivatives can still be removed
+        return False
+    last_used = max(head['LastModified'].timestamp(), float(head.get('Metadata', {}).get(LAST_REFERENCED_METADATA, 0)))
+    return time.time() - last_used < IMAGE_CLEANUP_GRACE_SECONDS
+
+def derivative_keys(image_key):
+    """Keys of the resized variants and manifest image_processor wrote for an image."""
+    prefix = f"{DERIVATIVES_PREFIX}{os.path.splitext(image_key)[0]}/"
+    keys = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=S3_BUCKET_NAME, Prefix=prefix):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []))
+    return keys
+
+def delete_objects(keys):
+    """DeleteObjects in batches of 1000, failing the invocation if any key is not deleted."""
+    for start in range(0, len(keys), DELETE_OBJECTS_BATCH_SIZE):
+        response = s3.delete_objects(
+            Bucket=S3_BUCKET_NAME,
+            Delete={'Objects': [{'Key': key} for key in keys[start:start + DELETE_OBJECTS_BATCH_SIZE]], 'Quiet': True}
+        )
+        if response.get('Errors'):
+            # Deleting is idempotent, so SQS retrying the whole batch is safe
+            raise Exception(f"Error deleting images: {response['Errors'][:5]}")
+
+def lambda_handler(event, context):
+    image_keys = set()
+    for record in event['Records']:
+        image_keys.update(json.loads(record['body'])['image_keys'])
+
+    keys = []
+    for image_key in sorted(image_keys):
+        if is_referenced(image_key) or recently_used(image_key):
+            continue
+        keys.append(image_key)
+        keys.extend(derivative_keys(image_key))
+    delete_objects(keys)
+    print(f"Deleted {len(keys)} objects for {len(image_keys)} queued images")
@@ -0,0 +1,144 @@
+import io
+import json
+import os
+import time
+from urllib.parse import unquote_plus
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from PIL import Image, ImageOps
+
+""" S3-triggered processor that turns every uploaded facility image into resized JPEG
+and WebP variants with the metadata stripped, records them in a manifest next to the
+variants, and writes the variant URLs back onto the facilities that use the image. """
+
+FACILITIES_TABLE = os.getenv('FACILITIES_TABLE', None)
+CATALOG_META_TABLE = os.getenv('CATALOG_META_TABLE', None)
+DERIVATIVES_PREFIX = 'derivatives/'
+# Widths of the responsive variants; the smallest one is the listing thumbnail
+VARIANT_WIDTHS = (320, 640, 1280)
+VARIANT_FORMATS = (('jpg', 'JPEG', 'image/jpeg'), ('webp', 'WEBP', 'image/webp'))
+VARIANT_QUALITY = 80
+VARIANT_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# ImageKeyIndex is eventually consistent; how long to wait before querying it again
+INDEX_SETTLE_SECONDS = float(os.getenv('INDEX_SETTLE_SECONDS', 2))
+
+s3 = boto3.client('s3')
+dynamodb = boto3.resource('dynamodb')
+table = dynamodb.Table(FACILITIES_TABLE)
+meta_table = dynamodb.Table(CATALOG_META_TABLE)
+
+def derivatives_prefix(image_key):
+    """Prefix the variants of an image live under, e.g. derivatives/uploads/<uuid>/.
+
+    storage_facilities.manifest_key() follows the same layout.
+    """
+    return f"{DERIVATIVES_PREFIX}{os.path.splitext(image_key)[0]}/"
+
+def public_url(bucket, key):
+    return f"https://{bucket}.s3.amazonaws.com/{key}"
+
+def render_variants(data):
+    """Yield (width, extension, content type, bytes) for every variant of an image.
+
+    Images are never scaled up, so a small original yields fewer widths. Only the pixels
+    are re-encoded, which drops EXIF, GPS and any other metadata of the upload.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    widths = [width for width in VARIANT_WIDTHS if width < image.width] + [min(image.width, VARIANT_WIDTHS[-1])]
+    for width in sorted(set(widths)):
+        resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        for extension, image_format, content_type in VARIANT_FORMATS:
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, quality=VARIANT_QUALITY, optimize=True)
+            yield width, extension, content_type, buffer.getvalue()
+
+def process_image(bucket, image_key):
+    """Write the variants and manifest of one image and return the manifest."""
+    data = s3.get_object(Bucket=bucket, Key=image_key)['Body'].read()
+    prefix = derivatives_prefix(image_key)
+    variants = []
+    for width, extension, content_type, body in render_variants(data):
+        key = f"{prefix}{width}w.{extension}"
+        s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType=content_type, CacheControl=VARIANT_CACHE_CONTROL)
+        variants.append({'width': width, 'format': extension, 'url': public_url(bucket, key)})
+
+    thumbnail = next(variant for variant in variants if variant['format'] == 'webp')
+    manifest = {'source': image_key, 'variants': variants, 'thumbnail_url': thumbnail['url']}
+    s3.put_object(Bucket=bucket, Key=f"{prefix}manifest.json", Body=json.dumps(manifest).encode('utf-8'),
+                  ContentType='application/json')
+    return manifest
+
+def attach_variants(image_key, manifest, done=frozenset()):
+    """Write the variant URLs onto every facility that uses the image, except those in done.
+
+    A facility created before the manifest existed is found through ImageKeyIndex;
+    one created afterwards copies the manifest itself in add_facility. Returns the ids
+    of the facilities updated.
+    """
+    updated = set()
+    params = {'IndexName': 'ImageKeyIndex', 'KeyConditionExpression': Key('image_key').eq(image_key)}
+    while True:
+        response = table.query(**params)
+        for facility in response.get('Items', []):
+            if facility['facility_id'] in done:
+                continue
+            try:
+                table.update_item(
+                    Key={'facility_id': facility['facility_id']},
+                    UpdateExpression='SET image_variants = :variants, thumbnail_url = :thumbnail',
+                    ConditionExpression='attribute_exists(facility_id)',
+                    ExpressionAttributeValues={':variants': manifest['variants'], ':thumbnail': manifest['thumbnail_url']}
+                )
+                updated.add(facility['facility_id'])
+            except ClientError as e:
+                # Skip facilities deleted since the index was read
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+        if 'LastEvaluatedKey' not in response:
+            break
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return updated
+
+def bump_catalog_version():
+    """Bump the catalog version, like storage_facilities.bump_catalog_version().
+
+    The facilities API caches and ETags its reads by this version, and the bump also
+    triggers the snapshot and search index rebuild.
+    """
+    meta_table.update_item(
+        Key={'meta_id': 'catalog_version'},
+        UpdateExpression='ADD version :one',
+        ExpressionAttributeValues={':one': 1}
+    )
+
+def existing_manifest(bucket, image_key):
+    """Manifest of an image whose variants were already written, or None."""
+    try:
+        response = s3.get_object(Bucket=bucket, Key=f"{derivatives_prefix(image_key)}manifest.json")
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'NoSuchKey':
+            raise
+        return None
+    return json.loads(response['Body'].read())
+
+def lambda_handler(event, context):
+    attached = []
+    for record in event['Records']:
+        bucket = record['s3']['bucket']['name']
+        image_key = unquote_plus(record['s3']['object']['key'])
+        # Content-addressed images never change, so a rewrite of one is not reprocessed
+        manifest = existing_manifest(bucket, image_key) if image_key.startswith('images/') else None
+        if manifest is None:
+            manifest = process_image(bucket, image_key)
+        attached.append((image_key, manifest, attach_variants(image_key, manifest)))
+
+    # A facility written just before its manifest can be missing from ImageKeyIndex and
+    # still have read no manifest in add_facility, so look again once the index settles
+    time.sleep(INDEX_SETTLE_SECONDS)
+    updated = 0
+    for image_key, manifest, done in attached:
+        updated += len(done) + len(attach_variants(image_key, manifest, done))
+    if updated:
+        bump_catalog_version()
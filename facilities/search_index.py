@@ -0,0 +1,156 @@
+import decimal
+import gzip
+import json
+import math
+import re
+from bisect import bisect_left
+from collections import Counter
+
+from json_encoder import DecimalEncoder
+
+""" Compact inverted index over facility names and descriptions, ranked with BM25.
+The index is plain JSON so it can be persisted to S3 and loaded into warm containers.
+It keeps only the fields needed to filter, sort and suggest; the facilities themselves
+are read from the table once a page of matches is known. """
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+    'of', 'on', 'or', 'the', 'to', 'with', 'your', 'our', 'all'
+])
+# Text fields that are indexed, with how many times each token counts
+INDEXED_FIELDS = (('facility_name', 2), ('description', 1), ('location', 1), ('type', 1))
+# Fields kept for every document
+DOC_FIELDS = ('facility_id', 'facility_name', 'location', 'type', 'price', 'capacity')
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Weight of an index term that only matches a query term as a prefix
+PREFIX_WEIGHT = 0.5
+MAX_PREFIX_EXPANSIONS = 20
+# Fields offered as autocomplete suggestions, and how many prefix matches are ranked
+SUGGEST_FIELDS = ('location', 'facility_name')
+MAX_SUGGEST_CANDIDATES = 200
+WORD_START_PATTERN = re.compile(r'\b\w')
+
+
+def tokenize(text):
+    """Lowercase text and split it into searchable tokens, dropping stopwords."""
+    return [token for token in TOKEN_PATTERN.findall(str(text).lower()) if token not in STOPWORDS]
+
+
+def build_index(items, version=None):
+    """Build the inverted index for an iterable of facility items."""
+    docs = []
+    postings = {}
+    doc_lengths = []
+    for doc_id, item in enumerate(items):
+        docs.append({field: item[field] for field in DOC_FIELDS if field in item})
+        counts = {}
+        for field, weight in INDEXED_FIELDS:
+            for token in tokenize(item.get(field, '')):
+                counts[token] = counts.get(token, 0) + weight
+        for token, count in counts.items():
+            postings.setdefault(token, []).append([doc_id, count])
+        doc_lengths.append(sum(counts.values()))
+
+    return prepare_index({
+        'version': version,
+        'docs': docs,
+        'doc_lengths': doc_lengths,
+        'postings': postings
+    })
+
+
+def prepare_index(index):
+    """Add the lookup structures that are derived rather than persisted."""
+    index['terms'] = sorted(index['postings'])
+    lengths = index['doc_lengths']
+    index['avg_length'] = sum(lengths) / len(lengths) if lengths else 0.0
+    index['suggestions'] = build_suggestions(index['docs'])
+    index['suggestion_keys'] = [entry[0] for entry in index['suggestions']]
+    return index
+
+
+def build_suggestions(docs):
+    """Sorted (key, text, field, count) entries for prefix autocomplete.
+
+    Each distinct name or location is reachable from its start and from the start of
+    every later word, so 'town' suggests 'Cape Town'.
+    """
+    counts = Counter((field, str(doc[field])) for doc in docs for field in SUGGEST_FIELDS if doc.get(field))
+    entries = set()
+    for (field, text), count in counts.items():
+        lowered = text.lower()
+        for match in WORD_START_PATTERN.finditer(lowered):
+            entries.add((lowered[match.start():], text, field, count))
+    return sorted(entries)
+
+
+def dump_index(index):
+    """Serialize an index to gzip JSON for S3."""
+    persisted = {key: index[key] for key in ('version', 'docs', 'doc_lengths', 'postings')}
+    return gzip.compress(json.dumps(persisted, cls=DecimalEncoder, separators=(',', ':')).encode('utf-8'))
+
+
+def load_index(data):
+    """Load an index written by dump_index."""
+    index = json.loads(gzip.decompress(data).decode('utf-8'), parse_float=decimal.Decimal)
+    return prepare_index(index)
+
+
+def expand_term(index, term):
+    """Index terms matched by a query term: itself, plus terms it is a prefix of."""
+    terms = index['terms']
+    matches = []
+    position = bisect_left(terms, term)
+    while position < len(terms) and terms[position].startswith(term) and len(matches) < MAX_PREFIX_EXPANSIONS:
+        candidate = terms[position]
+        matches.append((candidate, 1.0 if candidate == term else PREFIX_WEIGHT))
+        position += 1
+    return matches
+
+
+def suggest(index, prefix, limit):
+    """Names and locations starting with prefix, most common first."""
+    prefix = prefix.strip().lower()
+    if not prefix:
+        return []
+    entries = index['suggestions']
+    position = bisect_left(index['suggestion_keys'], prefix)
+    candidates = {}
+    while position < len(entries) and entries[position][0].startswith(prefix) and len(candidates) < MAX_SUGGEST_CANDIDATES:
+        _, text, field, count = entries[position]
+        candidates[(text, field)] = count
+        position += 1
+    ranked = sorted(candidates.items(), key=lambda candidate: (-candidate[1], candidate[0][0]))
+    return [{'text': text, 'field': field} for (text, field), _ in ranked[:limit]]
+
+
+def search(index, query, predicate=None):
+    """Rank documents against a free-text query with BM25.
+
+    Returns (score, doc) pairs, best first. Each query term also matches index terms
+    it is a prefix of, at a reduced weight, so partial words still find results.
+    Documents rejected by predicate are skipped.
+    """
+    doc_count = len(index['docs'])
+    if not doc_count:
+        return []
+
+    scores = {}
+    for query_term in set(tokenize(query)):
+        for term, weight in expand_term(index, query_term):
+            postings = index['postings'][term]
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings:
+                length_norm = 1 - BM25_B + BM25_B * index['doc_lengths'][doc_id] / index['avg_length']
+                score = idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * score
+
+    ranked = []
+    for doc_id, score in scores.items():
+        doc = index['docs'][doc_id]
+        if predicate is None or predicate(doc):
+            ranked.append((score, doc))
+    ranked.sort(key=lambda pair: pair[0], reverse=True)
+    return ranked
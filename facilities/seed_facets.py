@@ -0,0 +1,25 @@
+import boto3
+import sys
+from collections import Counter
+from facets import FACETS_ID, TOTAL_ATTRIBUTE, facet_attributes
+
+""" One-off script that seeds the facet counts for facilities created before the
+facets stream consumer was deployed. Run it once, before any new facility writes.
+Usage: python seed_facets.py <facilities table name> <catalog meta table name> """
+
+table = boto3.resource('dynamodb').Table(sys.argv[1])
+meta_table = boto3.resource('dynamodb').Table(sys.argv[2])
+
+scan_params = {'ProjectionExpression': '#location, #type, price',
+               'ExpressionAttributeNames': {'#location': 'location', '#type': 'type'}}
+counts = Counter()
+while True:
+    response = table.scan(**scan_params)
+    for facility in response.get('Items', []):
+        counts.update(facet_attributes(facility) + [TOTAL_ATTRIBUTE])
+    if 'LastEvaluatedKey' not in response:
+        break
+    scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+meta_table.put_item(Item=dict(counts, meta_id=FACETS_ID))
+print(f"Seeded facet counts for {counts[TOTAL_ATTRIBUTE]} facilities")
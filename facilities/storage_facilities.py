@@ -1,44 +1,189 @@
 import json
 import boto3
+from boto3.dynamodb.conditions import Key, Attr
+from boto3.s3.transfer import TransferConfig
 import os
 import base64
 from botocore.exceptions import ClientError
 import uuid
 import decimal
+import gzip
+import hashlib
+import re
+import time
+import random
+import tempfile
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from scan_engine import parallel_scan, thread_table, concurrent_map
+from http_utils import get_header, get_body, compress_response
+from json_encoder import DecimalEncoder
+from projection import parse_fields, build_projection, project_item
+from idempotency import idempotent
+import search_index
+import geohash
+import facets
+from base64_stream import Base64Reader, iter_decoded
 
 FACILITIES_TABLE = os.getenv('FACILITIES_TABLE', None)
 S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME', None)
+SNAPSHOT_PREFIX = 'catalog/'
+SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv('SNAPSHOT_MAX_AGE_SECONDS', 60))
+SEARCH_INDEX_KEY = 'indexes/search_index.json.gz'
+CATALOG_META_TABLE = os.getenv('CATALOG_META_TABLE', None)
+IMAGE_CLEANUP_QUEUE_URL = os.getenv('IMAGE_CLEANUP_QUEUE_URL', None)
+# Cleanup messages are delayed so image_cleanup sees ImageKeyIndex settled; 900 is the SQS maximum
+IMAGE_CLEANUP_DELAY_SECONDS = int(os.getenv('IMAGE_CLEANUP_DELAY_SECONDS', 900))
+CATALOG_CACHE_TTL_SECONDS = float(os.getenv('CATALOG_CACHE_TTL_SECONDS', 5))
+# Measured as JSON; the same items as Python dicts of Decimals take several times as
+# much heap.
+CATALOG_CACHE_MAX_BYTES = int(os.getenv('CATALOG_CACHE_MAX_BYTES', 4 * 1024 * 1024))
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 200))
+DEFAULT_SUGGEST_LIMIT = 8
+MAX_SUGGEST_LIMIT = 20
+# Images are uploaded straight to S3 with a presigned POST under UPLOAD_PREFIX, and
+# facilities are then created with the resulting object key.
+UPLOAD_PREFIX = 'uploads/'
+UPLOAD_URL_EXPIRY_SECONDS = int(os.getenv('UPLOAD_URL_EXPIRY_SECONDS', 300))
+MAX_IMAGE_BYTES = int(os.getenv('MAX_IMAGE_BYTES', 5 * 1024 * 1024))
+IMAGE_CONTENT_TYPES = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/webp': 'webp'}
+# Images whose SHA-256 is known are stored content-addressed under IMAGE_PREFIX, so an
+# identical image is written once and its URL never changes. image_processor resizes
+# everything under IMAGE_PREFIX and UPLOAD_PREFIX into DERIVATIVES_PREFIX.
+IMAGE_PREFIX = 'images/'
+DERIVATIVES_PREFIX = 'derivatives/'
+IMAGE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Set whenever an existing image is referenced again, see touch_image()
+LAST_REFERENCED_METADATA = 'last-referenced'
+UPLOAD_KEY_PATTERN = re.compile(r'^(uploads/[0-9a-f-]{36}|images/[0-9a-f]{64})\.(jpg|png|webp)$')
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+# Attributes a PATCH may change; derived attributes follow from them
+UPDATABLE_FIELDS = ('facility_name', 'location', 'type', 'capacity', 'price', 'description',
+                    'latitude', 'longitude', 'image_key')
+# Base64 images are streamed to S3, switching to a multipart upload of parallel parts
+# above the threshold. At most IMAGE_UPLOAD_BUFFERED_PARTS parts are held in memory, so
+# peak memory stays around that times the part size whatever the image size.
+IMAGE_UPLOAD_BUFFERED_PARTS = 4
+IMAGE_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=5 * 1024 * 1024,
+    max_concurrency=IMAGE_UPLOAD_BUFFERED_PARTS,
+    use_threads=True
+)
+IMAGE_TRANSFER_CONFIG.max_in_memory_upload_chunks = IMAGE_UPLOAD_BUFFERED_PARTS
+FACILITY_CACHE_SIZE = int(os.getenv('FACILITY_CACHE_SIZE', 256))
+FACILITY_MAX_AGE_SECONDS = int(os.getenv('FACILITY_MAX_AGE_SECONDS', 30))
+
+# How many of the table's GSIs have been rolled out, one per deploy, in template order:
+# LocationTypeIndex, LocationIndex, TypeIndex, GeohashIndex, ImageKeyIndex
+FACILITIES_INDEX_STAGE = int(os.getenv('FACILITIES_INDEX_STAGE', 5))
+GEOHASH_INDEX_STAGE = 4
+# Global secondary indexes that can answer a search, most selective first. Each one is
+# keyed on the search fields listed, joined with '#' when there is more than one, and
+# sorted on sort_key so range filters on it become key conditions. Indexes past
+# FACILITIES_INDEX_STAGE are left out, so searches fall back to a scan until they exist.
+SEARCH_INDEXES = tuple(index for index in (
+    {'name': 'LocationTypeIndex', 'key': 'location_type', 'fields': ('location', 'type'), 'sort_key': 'price', 'stage': 1},
+    {'name': 'LocationIndex', 'key': 'location', 'fields': ('location',), 'sort_key': 'price', 'stage': 2},
+    {'name': 'TypeIndex', 'key': 'type', 'fields': ('type',), 'sort_key': 'price', 'stage': 3},
+) if index['stage'] <= FACILITIES_INDEX_STAGE)
+SEARCH_SORT_FIELDS = ('price', 'capacity')
+# Facilities store a full geohash plus a short prefix that partitions GeohashIndex.
+# A nearby search covers its circle with the finest cells that keep the number of
+# queries at or under MAX_NEARBY_CELLS.
+GEOHASH_PRECISION = 9
+GEOHASH_PREFIX_PRECISION = 3
+NEARBY_PRECISIONS = (5, 4, 3)
+MAX_NEARBY_CELLS = 12
+DEFAULT_NEARBY_RADIUS_KM = decimal.Decimal(10)
+MAX_NEARBY_RADIUS_KM = decimal.Decimal(100)
+# BatchGetItem reads at most 100 keys per call and BatchWriteItem writes at most 25
+# items; larger requests are split, and unprocessed keys or items are retried with
+# full-jitter backoff.
+MAX_BATCH_GET_IDS = int(os.getenv('MAX_BATCH_GET_IDS', 300))
+BATCH_GET_CHUNK_SIZE = 100
+BATCH_WRITE_CHUNK_SIZE = 25
+BATCH_MAX_ATTEMPTS = 6
+BATCH_BASE_DELAY_SECONDS = 0.05
+BATCH_MAX_DELAY_SECONDS = 2
+# Bulk imports prepare rows, including their image uploads, on a bounded thread pool
+MAX_BULK_ITEMS = int(os.getenv('MAX_BULK_ITEMS', 500))
+BULK_IMAGE_WORKERS = int(os.getenv('BULK_IMAGE_WORKERS', 8))
 
 dynamodb = boto3.resource('dynamodb')
 s3 = boto3.client('s3')
+sqs = boto3.client('sqs')
 table = dynamodb.Table(FACILITIES_TABLE)
+meta_table = dynamodb.Table(CATALOG_META_TABLE)
 
-def convert_decimal(obj):
-    """Convert Decimal objects to float."""
-    if isinstance(obj, decimal.Decimal):
-        return float(obj)
-    elif isinstance(obj, dict):
-        return {key: convert_decimal(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_decimal(item) for item in obj]
-    else:
-        return obj
+# Last catalog version read, trusted for CATALOG_CACHE_TTL_SECONDS after checked_at
+version_stamp = {'version': None, 'checked_at': None}
+# Facility catalog kept in memory across warm invocations, sorted by facility_id.
+# items is None when the catalog is larger than CATALOG_CACHE_MAX_BYTES.
+catalog_cache = {'version': None, 'items': None, 'ids': None}
+# Least recently used facilities read by id, dropped whenever the catalog version moves on
+facility_cache = {'version': None, 'items': OrderedDict()}
+# Full-text index for the catalog, loaded lazily from S3, and the catalog version it was
+# last loaded for, see get_search_index()
+search_index_cache = {'index': None, 'version': None}
+# Whether the full catalog snapshot has been seen in S3; once built it is only replaced
+snapshot_state = {'built': False}
 
-def create_cors_response(status_code, body):
-    """Create a response with CORS headers"""
+def create_cors_response(status_code, body, headers=None):
+    """Create a response with CORS headers, plus any extra headers given"""
+    response_headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,If-None-Match,Idempotency-Key',
+        'Access-Control-Allow-Methods': 'GET,POST,PUT,PATCH,DELETE,OPTIONS',
+        'Access-Control-Allow-Credentials': 'false'
+    }
+    if headers:
+        response_headers.update(headers)
     return {
         'statusCode': status_code,
-        'headers': {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-            'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
-            'Access-Control-Allow-Credentials': 'false'
-        },
-        'body': json.dumps(convert_decimal(body)) if body else ''
+        'headers': response_headers,
+        'body': json.dumps(body, cls=DecimalEncoder) if body is not None else ''
     }
-    
+
+def encode_cursor(last_evaluated_key):
+    """Encode a DynamoDB LastEvaluatedKey as an opaque, URL-safe cursor."""
+    if not last_evaluated_key:
+        return None
+    raw = json.dumps(last_evaluated_key, cls=DecimalEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor back into an ExclusiveStartKey."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(raw.decode('utf-8'), parse_float=decimal.Decimal, parse_int=decimal.Decimal)
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    if not isinstance(key, dict) or not key:
+        raise ValueError('Invalid cursor')
+    return key
+
+def parse_limit(query_params):
+    """Read the page size from the query string, capped at MAX_PAGE_SIZE."""
+    limit = query_params.get('limit')
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, MAX_PAGE_SIZE)
+
 
 def lambda_handler(event, context):
+    response = route_request(event)
+    return compress_response(response, get_header(event, 'Accept-Encoding'), get_header(event, 'Accept'))
+
+def route_request(event):
     # Handle OPTIONS requests for CORS preflight
     if event['httpMethod'] == 'OPTIONS':
         return create_cors_response(200, None)
@@ -48,13 +193,38 @@ def lambda_handler(event, context):
 
     try:
         if method == 'GET':
+            query_params = event.get('queryStringParameters') or {}
             if path == '/facilities':
-                return get_all_facilities()
+                return conditional_get(event, lambda: get_all_facilities(query_params))
+            elif path == '/facilities/export':
+                return conditional_get(event, export_facilities)
+            elif path == '/facilities/snapshot':
+                return get_catalog_snapshot(query_params)
             elif path == '/facilities/search':
-                query_params = event.get('queryStringParameters', {})
-                return search_facilities(query_params)
+                return conditional_get(event, lambda: search_facilities(query_params))
+            elif path == '/facilities/facets':
+                return get_facets()
+            elif path == '/facilities/nearby':
+                return conditional_get(event, lambda: get_nearby_facilities(query_params))
+            elif path == '/facilities/suggest':
+                return conditional_get(event, lambda: suggest_facilities(query_params))
+            elif path == '/facilities/{facility_id}':
+                facility_id = event['pathParameters']['facility_id']
+                return conditional_get(event, lambda: get_facility(facility_id, query_params),
+                                       cache_control=f'public, max-age={FACILITY_MAX_AGE_SECONDS}')
         elif method == 'POST' and path == '/facilities':
-            return add_facility(event)
+            return idempotent(event, add_facility, create_cors_response)
+        elif method == 'POST' and path == '/facilities/batch-get':
+            return batch_get_facilities(event)
+        elif method == 'POST' and path == '/facilities/batch-delete':
+            return batch_delete_facilities(event)
+        elif method == 'POST' and path == '/facilities/bulk':
+            return idempotent(event, bulk_add_facilities, create_cors_response)
+        elif method == 'POST' and path == '/facilities/upload-url':
+            return create_upload_url(event)
+        elif method == 'PATCH' and path == '/facilities/{facility_id}':
+            facility_id = event['pathParameters']['facility_id']
+            return update_facility(facility_id, event)
         elif method == 'DELETE' and path == '/facilities/{facility_id}':
             facility_id = event['pathParameters']['facility_id']
             return delete_facility(facility_id)
@@ -63,104 +233,1372 @@ def lambda_handler(event, context):
     except Exception as e:
         return create_cors_response(500, {'error': str(e)})
 
-def get_all_facilities():
+def get_catalog_version():
+    """Read the catalog version stamp that every facility write bumps."""
+    response = meta_table.get_item(Key={'meta_id': 'catalog_version'}, ProjectionExpression='version')
+    return int(response.get('Item', {}).get('version', 0))
+
+def current_catalog_version():
+    """Catalog version, reusing the last stamp read while it is inside the cache TTL.
+
+    The ETag, the facility LRU and the catalog cache all go through here, so a request
+    reads the stamp from DynamoDB at most once and not at all inside the TTL.
+    """
+    now = time.monotonic()
+    checked_at = version_stamp['checked_at']
+    if checked_at is None or now - checked_at >= CATALOG_CACHE_TTL_SECONDS:
+        version_stamp['version'] = get_catalog_version()
+        version_stamp['checked_at'] = now
+    return version_stamp['version']
+
+def catalog_version_bump():
+    """TransactWriteItems entry that increments the catalog version."""
+    return {'Update': {
+        'TableName': meta_table.name,
+        'Key': {'meta_id': 'catalog_version'},
+        'UpdateExpression': 'ADD version :one',
+        'ExpressionAttributeValues': {':one': 1}
+    }}
+
+def write_facility(write):
+    """Apply one facility Put, Update or Delete together with the catalog version bump.
+
+    Both happen in one transaction, so a write is never left in place without the bump
+    that invalidates the caches, and a failed bump never reports an error for a facility
+    that was already written. Every write bumps the same item, so transactions that
+    conflict on it are retried with backoff.
+    """
+    for attempt in range(BATCH_MAX_ATTEMPTS):
+        batch_backoff(attempt)
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=[write, catalog_version_bump()])
+            break
+        except ClientError as e:
+            codes = {reason.get('Code') for reason in e.response.get('CancellationReasons', [])}
+            if ('TransactionConflict' not in codes or 'ConditionalCheckFailed' in codes
+                    or attempt == BATCH_MAX_ATTEMPTS - 1):
+                raise
+    # The transaction does not return the new version, so read it at the next request
+    version_stamp['checked_at'] = None
+
+def cancellation_reason(error):
+    """The reason the facility write of a write_facility() transaction was cancelled."""
+    if error.response['Error']['Code'] != 'TransactionCanceledException':
+        return None
+    reasons = error.response.get('CancellationReasons') or [{}]
+    return reasons[0]
+
+def expect_values(expected, names, values):
+    """Condition that each attribute in expected still holds its value, or is absent for None."""
+    conditions = []
+    for index, (field, value) in enumerate(expected.items()):
+        names[f"#e{index}"] = field
+        if value is None:
+            conditions.append(f"attribute_not_exists(#e{index})")
+        else:
+            values[f":e{index}"] = value
+            conditions.append(f"#e{index} = :e{index}")
+    return conditions
+
+def bump_catalog_version():
+    """Atomically increment the catalog version after a facility write."""
+    response = meta_table.update_item(
+        Key={'meta_id': 'catalog_version'},
+        UpdateExpression='ADD version :one',
+        ExpressionAttributeValues={':one': 1},
+        ReturnValues='UPDATED_NEW'
+    )
+    version = int(response['Attributes']['version'])
+    version_stamp['version'] = version
+    version_stamp['checked_at'] = time.monotonic()
+    return version
+
+def load_catalog():
+    """Read the whole catalog, giving up once it grows past CATALOG_CACHE_MAX_BYTES.
+
+    The scan is strongly consistent: it runs right after a version bump, and an
+    eventually consistent read could miss the write and be cached under the new version.
+    """
+    items = []
+    size = 0
+    scan = parallel_scan(table, ConsistentRead=True)
+    for item in scan:
+        size += len(json.dumps(item, cls=DecimalEncoder))
+        if size > CATALOG_CACHE_MAX_BYTES:
+            scan.close()
+            return None
+        items.append(item)
+    items.sort(key=lambda item: item['facility_id'])
+    return items
+
+def get_cached_catalog():
+    """Return the facility catalog from the warm-container cache.
+
+    The cached copy is served as long as current_catalog_version() matches it, and the
+    catalog is only scanned again once the version has moved on. Returns None when the
+    catalog is too large to cache, in which case callers read DynamoDB directly.
+    """
+    # Read the version before the catalog so a concurrent write can only make the
+    # cached copy look older than it is, never newer.
+    version = current_catalog_version()
+    if version != catalog_cache['version']:
+        items = load_catalog()
+        catalog_cache['version'] = version
+        catalog_cache['items'] = items
+        catalog_cache['ids'] = [item['facility_id'] for item in items] if items is not None else None
+    return catalog_cache['items']
+
+def decode_catalog_cursor(cursor):
+    """Decode a /facilities cursor, which must be a facility_id key like the table's own."""
+    start_key = decode_cursor(cursor)
+    if set(start_key) != {'facility_id'} or not isinstance(start_key['facility_id'], str):
+        raise ValueError('Invalid cursor')
+    return start_key
+
+def get_catalog_page(items, ids, limit, start_key):
+    """Serve one page of the cached catalog, continuing after start_key's facility_id."""
+    start = bisect_right(ids, start_key['facility_id']) if start_key else 0
+    page = items[start:start + limit]
+    next_key = None
+    if start + limit < len(items):
+        next_key = {'facility_id': page[-1]['facility_id']}
+    return page, next_key
+
+def catalog_etag(event):
+    """Weak ETag for a catalog read, built from the catalog version and the request.
+
+    The same tag covers the gzip, brotli and identity encodings of the response, which
+    lambda_handler picks after this runs, so it is weak: the bodies are equivalent but
+    not byte-for-byte identical.
+    """
+    request = json.dumps([event['resource'], event.get('pathParameters') or {}, event.get('queryStringParameters') or {}], sort_keys=True)
+    digest = hashlib.sha256(request.encode('utf-8')).hexdigest()[:16]
+    return f'W/"{current_catalog_version()}-{digest}"'
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header against an ETag, using weak comparison."""
+    if not if_none_match:
+        return False
+    opaque_tag = etag[2:] if etag.startswith('W/') else etag
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or any((tag[2:] if tag.startswith('W/') else tag) == opaque_tag for tag in tags)
+
+def conditional_get(event, read, cache_control='no-cache'):
+    """Run a catalog read, or answer 304 if the client's copy is still current.
+
+    The ETag depends only on the catalog version and the request, so a matching
+    If-None-Match is answered without running the read at all.
+    """
+    etag = catalog_etag(event)
+    headers = {'ETag': etag, 'Cache-Control': cache_control, 'Access-Control-Expose-Headers': 'ETag'}
+    if etag_matches(get_header(event, 'If-None-Match'), etag):
+        return create_cors_response(304, None, headers)
+
+    response = read()
+    if response['statusCode'] == 200:
+        response['headers'].update(headers)
+    return response
+
+def get_facility(facility_id, query_params):
+    """Read one facility, from the warm-container LRU when it is hot.
+
+    Full items are cached per catalog version. A projected read that misses the cache
+    goes to DynamoDB with the projection and is not cached, since it is only part of
+    the item.
+    """
+    try:
+        fields = parse_fields(query_params)
+        # Read the version before the item so a concurrent write can only make the
+        # cached entry look older than it is, never newer.
+        version = current_catalog_version()
+        if facility_cache['version'] != version:
+            facility_cache['version'] = version
+            facility_cache['items'].clear()
+
+        item = facility_cache['items'].get(facility_id)
+        if item is not None:
+            facility_cache['items'].move_to_end(facility_id)
+        elif fields:
+            item = table.get_item(Key={'facility_id': facility_id}, **build_projection(fields)).get('Item')
+        else:
+            item = table.get_item(Key={'facility_id': facility_id}).get('Item')
+            if item is not None:
+                facility_cache['items'][facility_id] = item
+                if len(facility_cache['items']) > FACILITY_CACHE_SIZE:
+                    facility_cache['items'].popitem(last=False)
+
+        if item is None:
+            return create_cors_response(404, {'error': 'Facility not found'})
+        return create_cors_response(200, project_item(item, fields) if fields else item)
+    except ValueError as e:
+        return create_cors_response(400, {'error': str(e)})
+    except ClientError as e:
+        return create_cors_response(500, {'error': str(e)})
+
+def get_all_facilities(query_params):
     try:
-        response = table.scan()
-        facilities = response.get('Items', [])
-        return create_cors_response(200, facilities)
+        limit = parse_limit(query_params)
+        fields = parse_fields(query_params)
+        cursor = query_params.get('cursor')
+        start_key = decode_catalog_cursor(cursor) if cursor else None
+
+        # Pages from the cache follow facility_id order and DynamoDB pages follow scan
+        # order, so a cursor can skip or repeat items if the cache flips over its size
+        # limit while a client is part-way through the catalog.
+        items = get_cached_catalog()
+        if items is not None:
+            page, next_key = get_catalog_page(items, catalog_cache['ids'], limit, start_key)
+            if fields:
+                page = [project_item(item, fields) for item in page]
+            return create_cors_response(200, {'items': page, 'next_cursor': encode_cursor(next_key)})
+
+        scan_params = {'Limit': limit}
+        if fields:
+            scan_params.update(build_projection(fields))
+        if start_key:
+            scan_params['ExclusiveStartKey'] = start_key
+
+        response = table.scan(**scan_params)
+        return create_cors_response(200, {
+            'items': response.get('Items', []),
+            'next_cursor': encode_cursor(response.get('LastEvaluatedKey'))
+        })
+    except ValueError as e:
+        return create_cors_response(400, {'error': str(e)})
     except ClientError as e:
         return create_cors_response(500, {'error': str(e)})
 
-def search_facilities(query_params):
+def export_facilities():
+    """Return the whole catalog, read with a parallel segmented scan."""
     try:
-        location = query_params.get('location')
-        facility_type = query_params.get('type')
+        items = get_cached_catalog()
+        if items is None:
+            items = list(parallel_scan(table, ConsistentRead=True))
+        return create_cors_response(200, items)
+    except ClientError as e:
+        return create_cors_response(500, {'error': str(e)})
+
+def snapshot_key(dimension=None, value=None):
+    """S3 key of the full catalog snapshot, or of one location or type shard."""
+    if dimension is None:
+        return f"{SNAPSHOT_PREFIX}facilities.json.gz"
+    slug = re.sub(r'[^a-z0-9]+', '-', value.lower()).strip('-')
+    return f"{SNAPSHOT_PREFIX}{dimension}/{slug}.json.gz"
+
+def get_catalog_snapshot(query_params):
+    """Redirect to the precomputed catalog snapshot, or to a location or type shard.
+
+    Until the first rebuild has written the snapshots, the catalog is served live
+    instead. After that, a missing shard means no facility has that location or type.
+    """
+    location = query_params.get('location')
+    facility_type = query_params.get('type')
+    if location and facility_type:
+        return create_cors_response(400, {'error': 'Snapshots can be filtered by location or type, not both'})
 
-        filter_expression = []
-        expression_values = {}
+    try:
+        if not snapshot_state['built']:
+            snapshot_state['built'] = stored_catalog_version(snapshot_key()) >= 0
+        criteria = {field: value for field, value in (('location', location), ('type', facility_type)) if value}
+        if not snapshot_state['built']:
+            items = get_cached_catalog()
+            if items is None:
+                items = parallel_scan(table, ConsistentRead=True)
+            return create_cors_response(200, [item for item in items if item_matches(item, criteria, {})])
 
         if location:
-            filter_expression.append('location = :location')
-            expression_values[':location'] = location
+            key = snapshot_key('location', location)
+        elif facility_type:
+            key = snapshot_key('type', facility_type)
+        else:
+            key = snapshot_key()
+        if criteria and stored_catalog_version(key) < 0:
+            return create_cors_response(200, [])
+        return create_cors_response(302, None, {'Location': f"https://{S3_BUCKET_NAME}.s3.amazonaws.com/{key}"})
+    except ClientError as e:
+        return create_cors_response(500, {'error': str(e)})
+
+def stored_catalog_version(key):
+    """catalog-version metadata of a snapshot or index in S3, or -1 when there is none."""
+    try:
+        head = s3.head_object(Bucket=S3_BUCKET_NAME, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+            raise
+        return -1
+    return int(head.get('Metadata', {}).get('catalog-version', -1))
 
-        if facility_type:
-            filter_expression.append('#type = :type')
-            expression_values[':type'] = facility_type
+def open_snapshot(files, directory, key):
+    """Start the gzip JSON array spooled on disk for a snapshot key."""
+    snapshot = gzip.open(os.path.join(directory, f"{len(files)}.json.gz"), 'wt', encoding='utf-8')
+    snapshot.write('[')
+    files[key] = snapshot
+    return snapshot
 
-        filter_expression = " AND ".join(filter_expression) if filter_expression else None
+def append_to_snapshot(files, directory, key, item):
+    """Append an item to a spooled snapshot, starting it on the first item."""
+    if key in files:
+        files[key].write(',')
+    else:
+        open_snapshot(files, directory, key)
+    json.dump(item, files[key], cls=DecimalEncoder)
 
-        scan_params = {}
-        if filter_expression:
-            scan_params['FilterExpression'] = filter_expression
-            scan_params['ExpressionAttributeValues'] = expression_values
-            if facility_type:  # Add ExpressionAttributeNames only if type is used
-                scan_params['ExpressionAttributeNames'] = {'#type': 'type'}
+def rebuild_catalog_snapshots():
+    """Rewrite the gzip catalog snapshot and its per-location and per-type shards.
 
-        response = table.scan(**scan_params)
-        return create_cors_response(200, response.get('Items', []))
+    Snapshots are spooled to disk one item at a time, so a catalog too large for the
+    cache is streamed from the scan rather than held in memory. The full snapshot is
+    written last and records the catalog version, and a rebuild for a version no newer
+    than the stored one is skipped, so a late rebuild cannot overwrite a newer one.
+    Shards for locations or types that no longer have any facilities are deleted so
+    they cannot serve stale listings.
+    """
+    version = current_catalog_version()
+    if stored_catalog_version(snapshot_key()) >= version:
+        print(f"Catalog snapshots are already at version {version}")
+        return
+    items = get_cached_catalog()
+    if items is None:
+        items = parallel_scan(table, ConsistentRead=True)
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = {}
+        # The full snapshot is written even when the catalog is empty
+        full = open_snapshot(files, directory, snapshot_key())
+        for count, item in enumerate(items):
+            if count:
+                full.write(',')
+            json.dump(item, full, cls=DecimalEncoder)
+            for dimension in ('location', 'type'):
+                if item.get(dimension):
+                    append_to_snapshot(files, directory, snapshot_key(dimension, item[dimension]), item)
+        for snapshot in files.values():
+            snapshot.write(']')
+            snapshot.close()
+
+        shard_keys = [key for key in files if key != snapshot_key()]
+        for key in shard_keys + [snapshot_key()]:
+            s3.upload_file(files[key].name, S3_BUCKET_NAME, key, ExtraArgs={
+                'ContentType': 'application/json',
+                'ContentEncoding': 'gzip',
+                'CacheControl': f"public, max-age={SNAPSHOT_MAX_AGE_SECONDS}",
+                'Metadata': {'catalog-version': str(version)}
+            })
+
+    stale_keys = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=S3_BUCKET_NAME, Prefix=SNAPSHOT_PREFIX):
+        for obj in page.get('Contents', []):
+            if obj['Key'] not in files:
+                stale_keys.append({'Key': obj['Key']})
+    for start in range(0, len(stale_keys), 1000):
+        s3.delete_objects(Bucket=S3_BUCKET_NAME, Delete={'Objects': stale_keys[start:start + 1000]})
+
+def build_search_index():
+    """Build the full-text index for the current catalog version, streaming the scan."""
+    version = current_catalog_version()
+    items = get_cached_catalog()
+    if items is None:
+        items = parallel_scan(table, ConsistentRead=True)
+    return search_index.build_index(items, version)
+
+def rebuild_search_index():
+    """Rebuild the full-text index and persist it to S3, unless a newer one is stored."""
+    version = current_catalog_version()
+    if stored_catalog_version(SEARCH_INDEX_KEY) >= version:
+        print(f"Search index is already at version {version}")
+        return
+    index = build_search_index()
+    s3.put_object(
+        Bucket=S3_BUCKET_NAME,
+        Key=SEARCH_INDEX_KEY,
+        Body=search_index.dump_index(index),
+        ContentType='application/json',
+        ContentEncoding='gzip',
+        Metadata={'catalog-version': str(index['version'])}
+    )
+
+def get_search_index():
+    """Return the full-text index from S3, read again whenever the catalog version moves on.
+
+    Only rebuild_handler builds the index. Until it catches up with a write, the index
+    read from S3 is served as it is, and search_text() reads the matches themselves from
+    the table. Before the first rebuild there is no index in S3, and a catalog small
+    enough for the warm cache is indexed in memory instead; a larger one has no text
+    search until then.
+    """
+    version = current_catalog_version()
+    if search_index_cache['index'] is not None and search_index_cache['version'] == version:
+        return search_index_cache['index']
+
+    try:
+        response = s3.get_object(Bucket=S3_BUCKET_NAME, Key=SEARCH_INDEX_KEY)
+        index = search_index.load_index(response['Body'].read())
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'NoSuchKey':
+            raise
+        index = search_index.build_index(get_cached_catalog() or [], version)
+    search_index_cache['index'] = index
+    search_index_cache['version'] = version
+    return index
+
+def refresh_catalog():
+    """Bump the catalog version after a batch write, which cannot include the bump.
+
+    The bump invalidates the warm caches and ETags. The snapshots and the search index
+    are rebuilt off the request path by rebuild_handler, which the bump triggers. The
+    rows are already written, so a failed bump is logged rather than failing the request;
+    the caches then catch up with the next write.
+    """
+    try:
+        bump_catalog_version()
+    except ClientError as e:
+        print(f"Error bumping the catalog version: {str(e)}")
+
+def rebuild_handler(event, context):
+    """Stream consumer for catalog version bumps in the catalog meta table.
+
+    Rebuilds the snapshots and the search index once per batch of bumps, for the
+    version current when it runs. A failure is retried by Lambda, and the next bump
+    rebuilds again either way.
+    """
+    # Read the version afresh rather than trusting a stamp cached by a warm container
+    version_stamp['checked_at'] = None
+    rebuild_catalog_snapshots()
+    rebuild_search_index()
+
+def location_type_key(location, facility_type):
+    """Build the composite partition key used by LocationTypeIndex."""
+    return f"{location}#{facility_type}"
+
+def parse_number(query_params, name):
+    """Read an optional numeric query parameter as a Decimal."""
+    value = query_params.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        number = decimal.Decimal(value)
+    except decimal.InvalidOperation:
+        raise ValueError(f"{name} must be a number")
+    if not number.is_finite():
+        raise ValueError(f"{name} must be a number")
+    return number
+
+def parse_search(query_params):
+    """Split search parameters into exact-match criteria, numeric ranges and sort order."""
+    criteria = {}
+    for field in ('location', 'type'):
+        if query_params.get(field):
+            criteria[field] = query_params[field]
+
+    ranges = {}
+    for field in SEARCH_SORT_FIELDS:
+        low = parse_number(query_params, f"min_{field}")
+        high = parse_number(query_params, f"max_{field}")
+        if low is not None or high is not None:
+            ranges[field] = (low, high)
+
+    sort = query_params.get('sort')
+    if sort is not None and sort not in SEARCH_SORT_FIELDS:
+        raise ValueError(f"sort must be one of: {', '.join(SEARCH_SORT_FIELDS)}")
+    order = query_params.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+    return criteria, ranges, sort, order
+
+def range_condition(attribute, low, high):
+    """Build a between/>=/<= condition on a Key or Attr from optional bounds."""
+    if low is not None and high is not None:
+        return attribute.between(low, high)
+    if low is not None:
+        return attribute.gte(low)
+    return attribute.lte(high)
+
+def build_filter(criteria, ranges):
+    """AND together equality and range conditions, or None when there are none."""
+    conditions = [Attr(field).eq(value) for field, value in criteria.items()]
+    conditions += [range_condition(Attr(field), low, high) for field, (low, high) in ranges.items()]
+    if not conditions:
+        return None
+    condition = conditions[0]
+    for other in conditions[1:]:
+        condition = condition & other
+    return condition
+
+def plan_search(criteria, ranges=None, sort=None, order='asc'):
+    """Pick the cheapest way to answer a search.
+
+    Returns ('query', params) for the most selective index whose key is fully covered by
+    the criteria, preferring one whose sort key carries a range so the range becomes part
+    of the key condition. Anything not covered by the key is applied as a filter. When a
+    sort is requested only an index sorted on that field will do.
+
+    With no usable index the result is ('scan', params) for a filtered scan, or
+    ('sort', params) when the results still need sorting, see search_in_memory().
+    """
+    ranges = ranges or {}
+    candidates = [index for index in SEARCH_INDEXES
+                  if all(field in criteria for field in index['fields'])]
+    if sort:
+        candidates = [index for index in candidates if index['sort_key'] == sort]
+
+    if candidates:
+        index = max(candidates, key=lambda index: (len(index['fields']), index['sort_key'] in ranges))
+        key_value = '#'.join(criteria[field] for field in index['fields'])
+        key_condition = Key(index['key']).eq(key_value)
+        if index['sort_key'] in ranges:
+            key_condition = key_condition & range_condition(Key(index['sort_key']), *ranges[index['sort_key']])
+
+        params = {
+            'IndexName': index['name'],
+            'KeyConditionExpression': key_condition,
+            'ScanIndexForward': order != 'desc'
+        }
+        filter_expression = build_filter(
+            {field: value for field, value in criteria.items() if field not in index['fields']},
+            {field: bounds for field, bounds in ranges.items() if field != index['sort_key']}
+        )
+        if filter_expression is not None:
+            params['FilterExpression'] = filter_expression
+        return 'query', params
+
+    params = {}
+    filter_expression = build_filter(criteria, ranges)
+    if filter_expression is not None:
+        params['FilterExpression'] = filter_expression
+    return ('sort' if sort else 'scan'), params
+
+def item_matches(item, criteria, ranges):
+    """Apply search criteria and ranges to an item that is already in memory."""
+    if any(item.get(field) != value for field, value in criteria.items()):
+        return False
+    for field, (low, high) in ranges.items():
+        value = item.get(field)
+        if value is None or (low is not None and value < low) or (high is not None and value > high):
+            return False
+    return True
+
+def sort_items(items, sort, order):
+    """Sort items on a field, putting items without it last."""
+    ranked = sorted((item for item in items if sort in item), key=lambda item: item[sort], reverse=order == 'desc')
+    return ranked + [item for item in items if sort not in item]
+
+def decode_search_cursor(cursor, params, criteria, ranges):
+    """Decode a search cursor into an ExclusiveStartKey for the planned query or scan.
+
+    The key must have exactly the attributes DynamoDB returns for that index, inside the
+    key condition of the query, so a forged cursor is a 400 rather than a DynamoDB
+    ValidationException.
+    """
+    index = next((index for index in SEARCH_INDEXES if index['name'] == params.get('IndexName')), None)
+    if index is None:
+        # A scan of the table itself
+        return decode_catalog_cursor(cursor)
+
+    start_key = decode_cursor(cursor)
+    if set(start_key) != {'facility_id', index['key'], index['sort_key']}:
+        raise ValueError('Invalid cursor')
+    if not isinstance(start_key['facility_id'], str):
+        raise ValueError('Invalid cursor')
+    if start_key[index['key']] != '#'.join(criteria[field] for field in index['fields']):
+        raise ValueError('Invalid cursor')
+    sort_value = start_key[index['sort_key']]
+    low, high = ranges.get(index['sort_key'], (None, None))
+    if (not isinstance(sort_value, decimal.Decimal) or (low is not None and sort_value < low)
+            or (high is not None and sort_value > high)):
+        raise ValueError('Invalid cursor')
+    return start_key
+
+def page_by_offset(items, limit, start_key):
+    """Slice one page out of in-memory results, using an offset cursor."""
+    offset = 0
+    if start_key:
+        if not isinstance(start_key.get('offset'), decimal.Decimal):
+            raise ValueError('Invalid cursor')
+        offset = int(start_key['offset'])
+
+    page = items[offset:offset + limit]
+    next_key = {'offset': offset + limit} if offset + limit < len(items) else None
+    return page, next_key
+
+def search_in_memory(criteria, ranges, sort, order, scan_params, limit, start_key):
+    """Filter and sort the catalog when no index is sorted the way the search asks.
+
+    Uses the warm catalog cache when it is available and a filtered parallel scan
+    otherwise. The cursor here is an offset into the sorted results.
+    """
+    items = get_cached_catalog()
+    if items is not None:
+        items = [item for item in items if item_matches(item, criteria, ranges)]
+    else:
+        items = list(parallel_scan(table, ConsistentRead=True, **scan_params))
+    return page_by_offset(sort_items(items, sort, order), limit, start_key)
+
+def search_text(text, criteria, ranges, sort, order, limit, start_key):
+    """Answer a ?q= search from the in-memory full-text index.
+
+    Results are ranked by BM25 score unless a sort is requested, and the other search
+    parameters are applied as filters on the matches. Only the page of matches is read
+    from the table, and since the index can lag behind the table, facilities deleted
+    since or no longer matching the filters are left out of it.
+    """
+    matches = search_index.search(get_search_index(), text, lambda doc: item_matches(doc, criteria, ranges))
+    docs = [dict(doc, score=round(score, 4)) for score, doc in matches]
+    if sort:
+        docs = sort_items(docs, sort, order)
+    page, next_key = page_by_offset(docs, limit, start_key)
+
+    found, _ = batch_get([doc['facility_id'] for doc in page], {})
+    items = [
+        dict(found[doc['facility_id']], score=doc['score']) for doc in page
+        if doc['facility_id'] in found and item_matches(found[doc['facility_id']], criteria, ranges)
+    ]
+    return items, next_key
+
+def search_facilities(query_params):
+    try:
+        criteria, ranges, sort, order = parse_search(query_params)
+        limit = parse_limit(query_params)
+        fields = parse_fields(query_params)
+        cursor = query_params.get('cursor')
+
+        text = query_params.get('q')
+        operation, params = plan_search(criteria, ranges, sort, order)
+        if text or operation == 'sort':
+            # These page through in-memory results, see page_by_offset()
+            start_key = decode_cursor(cursor) if cursor else None
+            if text:
+                items, next_key = search_text(text, criteria, ranges, sort, order, limit, start_key)
+            else:
+                items, next_key = search_in_memory(criteria, ranges, sort, order, params, limit, start_key)
+            if fields:
+                items = [project_item(item, fields) for item in items]
+            return create_cors_response(200, {'items': items, 'next_cursor': encode_cursor(next_key)})
+
+        params['Limit'] = limit
+        if fields:
+            params.update(build_projection(fields))
+        if cursor:
+            params['ExclusiveStartKey'] = decode_search_cursor(cursor, params, criteria, ranges)
+
+        if operation == 'query':
+            response = table.query(**params)
+        else:
+            response = table.scan(**params)
+
+        return create_cors_response(200, {
+            'items': response.get('Items', []),
+            'next_cursor': encode_cursor(response.get('LastEvaluatedKey'))
+        })
+    except ValueError as e:
+        return create_cors_response(400, {'error': str(e)})
+    except ClientError as e:
+        return create_cors_response(500, {'error': str(e)})
+
+def suggest_facilities(query_params):
+    """Autocomplete facility names and locations from the prefix table in the search index."""
+    try:
+        limit = int(query_params.get('limit', DEFAULT_SUGGEST_LIMIT))
+        if not 1 <= limit <= MAX_SUGGEST_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_SUGGEST_LIMIT}")
+        suggestions = search_index.suggest(get_search_index(), query_params.get('prefix', ''), limit)
+        return create_cors_response(200, {'suggestions': suggestions})
+    except ValueError as e:
+        return create_cors_response(400, {'error': str(e)})
     except ClientError as e:
         return create_cors_response(500, {'error': str(e)})
 
+def get_facets():
+    """Facility counts per location, type and price band for the filter form."""
+    try:
+        return create_cors_response(200, facets.read_facets(meta_table))
+    except ClientError as e:
+        return create_cors_response(500, {'error': str(e)})
+
+def parse_coordinates(lat, lng):
+    """Validate a latitude/longitude pair and return it as Decimals."""
+    try:
+        lat = decimal.Decimal(str(lat))
+        lng = decimal.Decimal(str(lng))
+    except decimal.InvalidOperation:
+        raise ValueError('latitude and longitude must be numbers')
+    if not (lat.is_finite() and lng.is_finite()) or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('latitude and longitude are out of range')
+    return lat, lng
+
+def geo_attributes(lat, lng):
+    """Coordinates plus the geohash attributes that GeohashIndex is keyed on."""
+    lat, lng = parse_coordinates(lat, lng)
+    cell = geohash.encode(float(lat), float(lng), GEOHASH_PRECISION)
+    return {
+        'latitude': lat,
+        'longitude': lng,
+        'geohash': cell,
+        'geohash_prefix': cell[:GEOHASH_PREFIX_PRECISION]
+    }
+
+def nearby_cells(lat, lng, radius_km):
+    """Cover a circle with the finest geohash cells that need at most MAX_NEARBY_CELLS queries."""
+    for precision in NEARBY_PRECISIONS:
+        cells = geohash.covering_cells(lat, lng, radius_km, precision)
+        if len(cells) <= MAX_NEARBY_CELLS:
+            break
+    return cells
+
+def query_geohash_cell(cell, extra_params):
+    """Read every facility in one geohash cell from GeohashIndex."""
+    params = dict(
+        extra_params,
+        IndexName='GeohashIndex',
+        KeyConditionExpression=Key('geohash_prefix').eq(cell[:GEOHASH_PREFIX_PRECISION]) & Key('geohash').begins_with(cell)
+    )
+    items = []
+    cell_table = thread_table(table)
+    while True:
+        response = cell_table.query(**params)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def get_nearby_facilities(query_params):
+    """Facilities within radius_km of lat/lng, nearest first.
+
+    Only the geohash cells covering the circle are queried, concurrently, and the
+    candidates are then ranked by exact great-circle distance.
+    """
+    if FACILITIES_INDEX_STAGE < GEOHASH_INDEX_STAGE:
+        return create_cors_response(503, {'error': 'Nearby search is not available yet'})
+    try:
+        lat, lng = parse_coordinates(query_params.get('lat'), query_params.get('lng'))
+        radius_km = parse_number(query_params, 'radius_km')
+        if radius_km is None:
+            radius_km = DEFAULT_NEARBY_RADIUS_KM
+        if not 0 < radius_km <= MAX_NEARBY_RADIUS_KM:
+            raise ValueError(f"radius_km must be greater than 0 and at most {MAX_NEARBY_RADIUS_KM}")
+        limit = parse_limit(query_params)
+        fields = parse_fields(query_params)
+
+        # Coordinates are always read, the distance needs them
+        extra_params = build_projection(list(dict.fromkeys(fields + ['latitude', 'longitude']))) if fields else {}
+        cells = nearby_cells(float(lat), float(lng), float(radius_km))
+        cell_items = concurrent_map(lambda cell: query_geohash_cell(cell, extra_params), cells)
+
+        results = []
+        for items in cell_items:
+            for item in items:
+                distance = geohash.distance_km(float(lat), float(lng), float(item['latitude']), float(item['longitude']))
+                if distance <= radius_km:
+                    results.append(dict(item, distance_km=round(distance, 3)))
+        results.sort(key=lambda item: item['distance_km'])
+        results = results[:limit]
+        if fields:
+            results = [project_item(item, fields) for item in results]
+        return create_cors_response(200, {'items': results})
+    except ValueError as e:
+        return create_cors_response(400, {'error': str(e)})
+    except ClientError as e:
+        return create_cors_response(500, {'error': str(e)})
+
+def batch_backoff(attempt):
+    """Sleep before retrying a batch call, with full jitter on an exponential cap."""
+    if attempt:
+        time.sleep(random.uniform(0, min(BATCH_MAX_DELAY_SECONDS, BATCH_BASE_DELAY_SECONDS * 2 ** attempt)))
+
+def batch_get_chunk(keys, extra_params):
+    """BatchGetItem one chunk of keys, retrying unprocessed keys with full-jitter backoff.
+
+    Returns the items read and the keys still unprocessed after the last attempt.
+    """
+    items = []
+    request = {table.name: dict(extra_params, Keys=keys)}
+    # Runs on a worker thread, so it goes through that thread's own client
+    client = thread_table(table).meta.client
+    for attempt in range(BATCH_MAX_ATTEMPTS):
+        batch_backoff(attempt)
+        response = client.batch_get_item(RequestItems=request)
+        items.extend(response.get('Responses', {}).get(table.name, []))
+        request = response.get('UnprocessedKeys')
+        if not request:
+            return items, []
+    return items, request[table.name]['Keys']
+
+def parse_facility_ids(event):
+    """Read the de-duplicated facility_ids list of a batch request body."""
+    body = json.loads(get_body(event))
+    facility_ids = body['facility_ids']
+    if not isinstance(facility_ids, list) or not all(isinstance(facility_id, str) and facility_id for facility_id in facility_ids):
+        raise ValueError('facility_ids must be a list of facility ids')
+    facility_ids = list(dict.fromkeys(facility_ids))
+    if len(facility_ids) > MAX_BATCH_GET_IDS:
+        raise ValueError(f"At most {MAX_BATCH_GET_IDS} facility_ids can be requested at once")
+    return facility_ids
+
+def batch_get(facility_ids, extra_params):
+    """Read facilities by id in concurrent chunks; returns ({facility_id: item}, unprocessed ids)."""
+    chunks = [
+        [{'facility_id': facility_id} for facility_id in facility_ids[start:start + BATCH_GET_CHUNK_SIZE]]
+        for start in range(0, len(facility_ids), BATCH_GET_CHUNK_SIZE)
+    ]
+    found = {}
+    unprocessed = []
+    for items, keys in concurrent_map(lambda chunk: batch_get_chunk(chunk, extra_params), chunks):
+        found.update((item['facility_id'], item) for item in items)
+        unprocessed.extend(key['facility_id'] for key in keys)
+    return found, unprocessed
+
+def batch_get_facilities(event):
+    """Look up a set of facilities by id, returned in the order they were requested."""
+    try:
+        facility_ids = parse_facility_ids(event)
+        fields = parse_fields(event.get('queryStringParameters') or {})
+
+        # facility_id is always read so results can be put back in request order
+        extra_params = build_projection(list(dict.fromkeys(fields + ['facility_id']))) if fields else {}
+        found, unprocessed = batch_get(facility_ids, extra_params)
+
+        results = [found[facility_id] for facility_id in facility_ids if facility_id in found]
+        if fields:
+            results = [project_item(item, fields) for item in results]
+        return create_cors_response(200, {
+            'items': results,
+            'missing': [facility_id for facility_id in facility_ids if facility_id not in found and facility_id not in set(unprocessed)],
+            'unprocessed': unprocessed
+        })
+    except (KeyError, ValueError) as e:
+        return create_cors_response(400, {'error': f'Invalid request: {str(e)}'})
+    except ClientError as e:
+        return create_cors_response(500, {'error': str(e)})
+
+def validate_key_fields(body):
+    """Check the fields that become index keys, which DynamoDB rejects a whole write for.
+
+    location and type must be non-empty strings and price a number.
+    """
+    for field in ('location', 'type'):
+        if field in body and (not isinstance(body[field], str) or not body[field]):
+            raise ValueError(f'{field} must be a non-empty string')
+    if 'price' in body and (isinstance(body['price'], bool) or not isinstance(body['price'], (int, decimal.Decimal))):
+        raise ValueError('price must be a number')
+
+def build_facility_item(body):
+    """Validate a new facility, store its image and return the item to write."""
+    validate_key_fields(body)
+    facility_name = body['facility_name']
+    location = body['location']
+    facility_type = body['type']
+    capacity = body['capacity']
+    price = body['price']  # Add this line
+    description = body.get('description', '')
+    coordinates = {}
+    if 'latitude' in body or 'longitude' in body:
+        coordinates = geo_attributes(body['latitude'], body['longitude'])
+
+    # New clients upload the image first and send its key; the base64 body is kept
+    # for older clients
+    image_key = body.get('image_key')
+    if image_key is not None:
+        image_url = uploaded_image_url(image_key)
+    else:
+        image_key, image_url = save_image_to_s3(body['image'])
+
+    item = {
+        'facility_id': str(uuid.uuid4()),
+        'facility_name': facility_name,
+        'location': location,
+        'type': facility_type,
+        'location_type': location_type_key(location, facility_type),
+        'image_url': image_url,
+        'capacity': capacity,
+        'price': price,
+        'description': description,
+        'image_key': image_key,
+        'version': 1
+    }
+    # Variants already processed for this image; later ones are written back by image_processor
+    item.update(image_derivatives(image_key))
+    item.update(coordinates)
+    return item
+
 def add_facility(event):
     try:
-        body = json.loads(event['body'])
-        facility_name = body['facility_name']
-        location = body['location']
-        facility_type = body['type']
-        image_data = body['image']
-        capacity = body['capacity']
-        price = body['price']  # Add this line
-        description = body.get('description', '')
-
-        image_url = save_image_to_s3(image_data, facility_name)
-        facility_id = str(uuid.uuid4())
-
-        table.put_item(
-            Item={
-                'facility_id': facility_id,
-                'facility_name': facility_name,
-                'location': location,
-                'type': facility_type,
-                'image_url': image_url,
-                'capacity': capacity,
-                'price': price,
-                'description': description 
-            }
-        )
+        body = json.loads(get_body(event), parse_float=decimal.Decimal)
+        item = build_facility_item(body)
+        write_facility({'Put': {'TableName': table.name, 'Item': item}})
+        attach_late_derivatives([item], lambda update: write_facility({'Update': update}))
 
-        return create_cors_response(201, {'message': 'Facility added successfully!', 'facility_id': facility_id})
+        return create_cors_response(201, {'message': 'Facility added successfully!', 'facility_id': item['facility_id']})
     except ClientError as e:
         return create_cors_response(500, {'error': str(e)})
     except KeyError as e:
         return create_cors_response(400, {'error': f'Missing required field: {str(e)}'})
+    except ValueError as e:
+        return create_cors_response(400, {'error': str(e)})
+
+def derivatives_update(item, derivatives):
+    """Update that copies image variants onto a facility, if it still shows that image."""
+    return {
+        'TableName': table.name,
+        'Key': {'facility_id': item['facility_id']},
+        'UpdateExpression': 'SET image_variants = :variants, thumbnail_url = :thumbnail',
+        'ConditionExpression': 'image_key = :image_key',
+        'ExpressionAttributeValues': {
+            ':variants': derivatives['image_variants'],
+            ':thumbnail': derivatives['thumbnail_url'],
+            ':image_key': item['image_key']
+        }
+    }
+
+def attach_late_derivatives(items, write):
+    """Copy variants onto new facilities whose manifest appeared while they were written.
+
+    image_processor finds the facilities of an image through ImageKeyIndex, which can
+    miss one written moments before. build_facility_item read the manifest before the
+    write, so reading it again after the write covers a manifest that landed in between.
+    write applies each update; failures are only logged, the facilities are written.
+    """
+    image_keys = sorted({item['image_key'] for item in items if not item.get('thumbnail_url')})
+    if not image_keys:
+        return
+    try:
+        with ThreadPoolExecutor(max_workers=min(len(image_keys), BULK_IMAGE_WORKERS)) as executor:
+            manifests = dict(zip(image_keys, executor.map(image_derivatives, image_keys)))
+    except ClientError as e:
+        print(f"Error reading image manifests: {str(e)}")
+        return
+    for item in items:
+        derivatives = manifests.get(item['image_key']) if not item.get('thumbnail_url') else None
+        if not derivatives:
+            continue
+        try:
+            write(derivatives_update(item, derivatives))
+        except ClientError as e:
+            print(f"Error attaching image variants to {item['facility_id']}: {str(e)}")
+
+def facility_updates(facility_id, body):
+    """Attribute values to SET, attribute names to REMOVE and stored values to expect.
+
+    Only the supplied fields are written, plus whatever is derived from them:
+    location_type, the geohash attributes and the image URLs. When location_type is
+    derived from a stored location or type, that stored value is returned as expected
+    so the update can be made conditional on it still being there. The same goes for
+    the stored image when image_key is replaced, so the caller can queue its cleanup.
+    """
+    unknown = set(body) - set(UPDATABLE_FIELDS) - {'version'}
+    if unknown:
+        raise ValueError(f"Cannot update: {', '.join(sorted(unknown))}")
+    updates = {field: body[field] for field in UPDATABLE_FIELDS if field in body}
+    if not updates:
+        raise ValueError('No fields to update')
+    validate_key_fields(updates)
+    removes = []
+
+    # location_type needs both halves, so read the one that is not changing, and read
+    # the image that a new image_key replaces
+    read = []
+    if ('location' in updates) != ('type' in updates):
+        read.append('type' if 'location' in updates else 'location')
+    if 'image_key' in updates:
+        read.extend(['image_key', 'image_url'])
+    current = {}
+    if read:
+        current = table.get_item(
+            Key={'facility_id': facility_id},
+            ProjectionExpression=', '.join(f"#{field}" for field in read),
+            ExpressionAttributeNames={f"#{field}": field for field in read},
+            ConsistentRead=True
+        ).get('Item', {})
+    expected = {field: current.get(field) for field in read}
+
+    if 'location' in updates or 'type' in updates:
+        location = updates.get('location', current.get('location'))
+        facility_type = updates.get('type', current.get('type'))
+        if location is not None and facility_type is not None:
+            updates['location_type'] = location_type_key(location, facility_type)
+
+    if 'latitude' in updates or 'longitude' in updates:
+        updates.update(geo_attributes(body['latitude'], body['longitude']))
+
+    if 'image_key' in updates:
+        updates['image_url'] = uploaded_image_url(updates['image_key'])
+        derivatives = image_derivatives(updates['image_key'])
+        updates.update(derivatives)
+        if not derivatives:
+            removes = ['image_variants', 'thumbnail_url']
+    return updates, removes, expected
+
+def update_facility(facility_id, event):
+    """Change only the supplied attributes of a facility, guarded by its version.
+
+    A body 'version' makes the update conditional on the stored version, treating
+    facilities written before versioning as version 0. Every update bumps the version,
+    and one that derives location_type from the stored location or type is also
+    conditional on that value not having changed since it was read.
+    """
+    try:
+        body = json.loads(get_body(event), parse_float=decimal.Decimal)
+        if not isinstance(body, dict):
+            raise ValueError('The body must be a JSON object')
+        updates, removes, expected = facility_updates(facility_id, body)
+
+        names = {'#version': 'version'}
+        values = {':one': 1}
+        assignments = []
+        for index, (field, value) in enumerate(updates.items()):
+            names[f"#u{index}"] = field
+            values[f":u{index}"] = value
+            assignments.append(f"#u{index} = :u{index}")
+        update_expression = 'SET ' + ', '.join(assignments)
+        if removes:
+            for index, field in enumerate(removes):
+                names[f"#r{index}"] = field
+            update_expression += ' REMOVE ' + ', '.join(f"#r{index}" for index in range(len(removes)))
+        update_expression += ' ADD #version :one'
+
+        condition = 'attribute_exists(facility_id)'
+        if 'version' in body:
+            values[':expected'] = int(body['version'])
+            condition += ' AND #version = :expected'
+            if values[':expected'] == 0:
+                condition = 'attribute_exists(facility_id) AND (attribute_not_exists(#version) OR #version = :expected)'
+        condition = ' AND '.join([condition] + expect_values(expected, names, values))
+
+        try:
+            write_facility({'Update': {
+                'TableName': table.name,
+                'Key': {'facility_id': facility_id},
+                'UpdateExpression': update_expression,
+                'ConditionExpression': condition,
+                'ExpressionAttributeNames': names,
+                'ExpressionAttributeValues': values,
+                'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'
+            }})
+        except ClientError as e:
+            reason = cancellation_reason(e)
+            if reason is None or reason.get('Code') != 'ConditionalCheckFailed':
+                raise
+            if 'Item' not in reason:
+                return create_cors_response(404, {'error': 'Facility not found'})
+            current_version = int(reason['Item'].get('version', {}).get('N', 0))
+            return create_cors_response(409, {'error': 'The facility was changed by someone else', 'version': current_version})
+
+        if 'image_key' in updates:
+            if image_key_of(expected) != updates['image_key']:
+                enqueue_image_cleanup([image_key_of(expected)])
+            attach_late_derivatives([dict(updates, facility_id=facility_id)], lambda update: write_facility({'Update': update}))
+        # A transaction returns no attributes, so answer with what was written
+        attributes = dict(updates)
+        if 'version' in body:
+            attributes['version'] = values[':expected'] + 1
+        return create_cors_response(200, {'message': 'Facility updated successfully!', 'attributes': attributes})
+    except ValueError as e:
+        return create_cors_response(400, {'error': str(e)})
+    except KeyError as e:
+        return create_cors_response(400, {'error': f'Missing required field: {str(e)}'})
+    except ClientError as e:
+        return create_cors_response(500, {'error': str(e)})
+
+def parse_bulk_rows(text):
+    """Split a bulk body into rows: a JSON array, or NDJSON with one facility per line.
+
+    NDJSON lines are returned unparsed so a malformed line only fails its own row.
+    """
+    if text.lstrip().startswith('['):
+        rows = json.loads(text, parse_float=decimal.Decimal)
+    else:
+        rows = [line for line in text.splitlines() if line.strip()]
+    if not rows:
+        raise ValueError('No facilities to import')
+    if len(rows) > MAX_BULK_ITEMS:
+        raise ValueError(f"At most {MAX_BULK_ITEMS} facilities can be imported at once")
+    return rows
+
+def prepare_bulk_row(row):
+    """Build the item for one bulk row, returning (item, None) or (None, error)."""
+    try:
+        body = json.loads(row, parse_float=decimal.Decimal) if isinstance(row, str) else row
+        if not isinstance(body, dict):
+            raise ValueError('Each facility must be a JSON object')
+        return build_facility_item(body), None
+    except KeyError as e:
+        return None, f'Missing required field: {str(e)}'
+    except Exception as e:
+        # Bad data or a failed image upload only fails this row
+        return None, str(e)
+
+def batch_write(write_requests):
+    """BatchWriteItem put or delete requests in groups of 25, retrying unprocessed ones.
+
+    Returns (request, error) for every request that was not written: those still
+    unprocessed after the last attempt, and every request of a chunk DynamoDB rejected,
+    so one bad chunk does not fail the others.
+    """
+    failed = []
+    for start in range(0, len(write_requests), BATCH_WRITE_CHUNK_SIZE):
+        request = {table.name: write_requests[start:start + BATCH_WRITE_CHUNK_SIZE]}
+        try:
+            for attempt in range(BATCH_MAX_ATTEMPTS):
+                batch_backoff(attempt)
+                request = dynamodb.batch_write_item(RequestItems=request).get('UnprocessedItems')
+                if not request:
+                    break
+            else:
+                failed.extend((write, 'Not written because of throttling, retry this facility') for write in request[table.name])
+        except ClientError as e:
+            failed.extend((write, str(e)) for write in request[table.name])
+    return failed
+
+def bulk_add_facilities(event):
+    """Import many facilities in one request, reporting a result for every row.
+
+    Rows are prepared concurrently, written with BatchWriteItem, and the catalog is
+    refreshed once at the end rather than once per facility.
+    """
+    try:
+        rows = parse_bulk_rows(get_body(event) or '')
+        with ThreadPoolExecutor(max_workers=BULK_IMAGE_WORKERS) as executor:
+            prepared = list(executor.map(prepare_bulk_row, rows))
+
+        items = [item for item, _ in prepared if item is not None]
+        unwritten = {
+            write['PutRequest']['Item']['facility_id']: error
+            for write, error in batch_write([{'PutRequest': {'Item': item}} for item in items])
+        }
+
+        results = []
+        for index, (item, error) in enumerate(prepared):
+            if item is None:
+                results.append({'index': index, 'status': 'error', 'error': error})
+            elif item['facility_id'] in unwritten:
+                results.append({'index': index, 'status': 'error', 'error': unwritten[item['facility_id']]})
+            else:
+                results.append({'index': index, 'status': 'created', 'facility_id': item['facility_id']})
+        created = sum(1 for result in results if result['status'] == 'created')
+        if created:
+            attach_late_derivatives([item for item in items if item['facility_id'] not in unwritten],
+                                    lambda update: dynamodb.meta.client.update_item(**update))
+            refresh_catalog()
+        return create_cors_response(200, {'created': created, 'failed': len(results) - created, 'results': results})
+    except ValueError as e:
+        return create_cors_response(400, {'error': str(e)})
+    except ClientError as e:
+        return create_cors_response(500, {'error': str(e)})
+
+def image_key_of(facility):
+    """S3 key of a facility's image, also for facilities stored before image_key existed."""
+    if facility.get('image_key'):
+        return facility['image_key']
+    prefix = f"https://{S3_BUCKET_NAME}.s3.amazonaws.com/"
+    image_url = facility.get('image_url') or ''
+    return image_url[len(prefix):] if image_url.startswith(prefix) else None
+
+def enqueue_image_cleanup(image_keys):
+    """Hand images that deleted or updated facilities no longer use to image_cleanup, off the request path."""
+    image_keys = sorted(set(key for key in image_keys if key))
+    if not image_keys:
+        return
+    try:
+        sqs.send_message(QueueUrl=IMAGE_CLEANUP_QUEUE_URL, MessageBody=json.dumps({'image_keys': image_keys}),
+                         DelaySeconds=IMAGE_CLEANUP_DELAY_SECONDS)
+    except Exception as e:
+        # The facilities are gone either way; at worst their images stay behind
+        print(f"Error queueing image cleanup: {str(e)}")
+
+def batch_delete_facilities(event):
+    """Delete a set of facilities with BatchWriteItem and queue their images for cleanup."""
+    try:
+        facility_ids = parse_facility_ids(event)
+        # BatchWriteItem does not return old items, so read the image keys first
+        found, unread = batch_get(facility_ids, build_projection(['facility_id', 'image_key', 'image_url']))
+        unprocessed = {
+            write['DeleteRequest']['Key']['facility_id']
+            for write, _ in batch_write([{'DeleteRequest': {'Key': {'facility_id': facility_id}}} for facility_id in found])
+        }
+        unprocessed.update(unread)
+
+        deleted = [facility_id for facility_id in found if facility_id not in unprocessed]
+        if deleted:
+            enqueue_image_cleanup(image_key_of(found[facility_id]) for facility_id in deleted)
+            refresh_catalog()
+        return create_cors_response(200, {
+            'deleted': deleted,
+            'missing': [facility_id for facility_id in facility_ids if facility_id not in found and facility_id not in unprocessed],
+            'unprocessed': [facility_id for facility_id in facility_ids if facility_id in unprocessed]
+        })
+    except (KeyError, ValueError) as e:
+        return create_cors_response(400, {'error': f'Invalid request: {str(e)}'})
+    except ClientError as e:
+        return create_cors_response(500, {'error': str(e)})
 
 def delete_facility(facility_id):
     try:
-        response = table.delete_item(
+        # A transaction cannot return the deleted item, so read its image first and
+        # delete only if the image is still the one that will be cleaned up
+        facility = table.get_item(
             Key={'facility_id': facility_id},
-            ReturnValues='ALL_OLD'
-        )
-        
-        if 'Attributes' in response:
-            return create_cors_response(200, {'message': 'Facility deleted successfully!'})
-        else:
+            ProjectionExpression='facility_id, image_key, image_url',
+            ConsistentRead=True
+        ).get('Item')
+        if facility is None:
             return create_cors_response(404, {'message': 'Facility not found'})
+
+        names = {}
+        values = {}
+        expected = {field: facility.get(field) for field in ('image_key', 'image_url')}
+        conditions = ['attribute_exists(facility_id)'] + expect_values(expected, names, values)
+        delete = {'TableName': table.name, 'Key': {'facility_id': facility_id},
+                  'ConditionExpression': ' AND '.join(conditions), 'ExpressionAttributeNames': names,
+                  'ReturnValuesOnConditionCheckFailure': 'ALL_OLD'}
+        if values:
+            delete['ExpressionAttributeValues'] = values
+        try:
+            write_facility({'Delete': delete})
+        except ClientError as e:
+            reason = cancellation_reason(e)
+            if reason is None or reason.get('Code') != 'ConditionalCheckFailed':
+                raise
+            if 'Item' not in reason:
+                return create_cors_response(404, {'message': 'Facility not found'})
+            return create_cors_response(409, {'error': 'The facility was changed by someone else'})
+
+        enqueue_image_cleanup([image_key_of(facility)])
+        return create_cors_response(200, {'message': 'Facility deleted successfully!'})
     except ClientError as e:
         return create_cors_response(500, {'error': str(e)})
 
-def save_image_to_s3(image_data, facility_name):
+def create_upload_url(event):
+    """Presigned POST for uploading one facility image straight to S3.
+
+    The policy pins the object key, the content type and the allowed size, so the
+    image never passes through API Gateway or Lambda. A client that sends the image's
+    sha256 gets a content-addressed key, with the checksum pinned as well so S3 rejects
+    any other bytes; if that image is already stored there is nothing to upload.
+    """
     try:
-        image_binary = base64.b64decode(image_data)
-        image_filename = f"{facility_name}-{str(uuid.uuid4())}.jpg"
-        
-        s3.put_object(
+        body = json.loads(get_body(event) or '{}')
+        content_type = body.get('content_type', 'image/jpeg')
+        if content_type not in IMAGE_CONTENT_TYPES:
+            raise ValueError(f"content_type must be one of {', '.join(IMAGE_CONTENT_TYPES)}")
+        extension = IMAGE_CONTENT_TYPES[content_type]
+        fields = {'Content-Type': content_type}
+
+        digest = body.get('sha256')
+        if digest is not None:
+            if not isinstance(digest, str) or not SHA256_PATTERN.match(digest):
+                raise ValueError('sha256 must be a hex encoded SHA-256 digest')
+            image_key = f"{IMAGE_PREFIX}{digest}.{extension}"
+            if image_exists(image_key):
+                return create_cors_response(200, {'image_key': image_key, 'exists': True})
+            fields['Cache-Control'] = IMAGE_CACHE_CONTROL
+            fields['x-amz-checksum-algorithm'] = 'SHA256'
+            fields['x-amz-checksum-sha256'] = base64.b64encode(bytes.fromhex(digest)).decode('ascii')
+        else:
+            image_key = f"{UPLOAD_PREFIX}{uuid.uuid4()}.{extension}"
+
+        upload = s3.generate_presigned_post(
             Bucket=S3_BUCKET_NAME,
-            Key=image_filename,
-            Body=image_binary,
-            ContentType='image/jpeg'
+            Key=image_key,
+            Fields=fields,
+            Conditions=[{name: value} for name, value in fields.items()] + [
+                ['content-length-range', 1, MAX_IMAGE_BYTES]
+            ],
+            ExpiresIn=UPLOAD_URL_EXPIRY_SECONDS
         )
+        return create_cors_response(200, {
+            'exists': False,
+            'url': upload['url'],
+            'fields': upload['fields'],
+            'image_key': image_key,
+            'max_bytes': MAX_IMAGE_BYTES,
+            'expires_in': UPLOAD_URL_EXPIRY_SECONDS
+        })
+    except ValueError as e:
+        return create_cors_response(400, {'error': str(e)})
+    except ClientError as e:
+        return create_cors_response(500, {'error': str(e)})
+
+def image_exists(image_key):
+    """HEAD an image key in the bucket."""
+    try:
+        s3.head_object(Bucket=S3_BUCKET_NAME, Key=image_key)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+            raise
+        return False
+
+def touch_image(image_key):
+    """Stamp an existing image as just referenced; False if it is not stored.
+
+    Images are shared, so one that is about to be referenced again may already be
+    queued for cleanup by the delete of another facility. Copying the object onto
+    itself with a last-referenced time tells image_cleanup to keep it.
+    """
+    try:
+        head = s3.head_object(Bucket=S3_BUCKET_NAME, Key=image_key)
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+            raise
+        return False
+    extra_args = {'CacheControl': head['CacheControl']} if head.get('CacheControl') else {}
+    s3.copy_object(
+        Bucket=S3_BUCKET_NAME,
+        Key=image_key,
+        CopySource={'Bucket': S3_BUCKET_NAME, 'Key': image_key},
+        MetadataDirective='REPLACE',
+        ContentType=head.get('ContentType', 'binary/octet-stream'),
+        Metadata=dict(head.get('Metadata', {}), **{LAST_REFERENCED_METADATA: str(int(time.time()))}),
+        **extra_args
+    )
+    return True
+
+def uploaded_image_url(image_key):
+    """Public URL of an image uploaded with create_upload_url, once S3 has it."""
+    if not isinstance(image_key, str) or not UPLOAD_KEY_PATTERN.match(image_key):
+        raise ValueError('image_key must be a key returned by /facilities/upload-url')
+    if not touch_image(image_key):
+        raise ValueError('The image has not been uploaded yet')
+    return f"https://{S3_BUCKET_NAME}.s3.amazonaws.com/{image_key}"
+
+def manifest_key(image_key):
+    """Key of the manifest image_processor writes next to an image's variants."""
+    return f"{DERIVATIVES_PREFIX}{os.path.splitext(image_key)[0]}/manifest.json"
+
+def image_derivatives(image_key):
+    """Variant URLs of an image that has already been processed, or nothing yet."""
+    try:
+        response = s3.get_object(Bucket=S3_BUCKET_NAME, Key=manifest_key(image_key))
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'NoSuchKey':
+            raise
+        return {}
+    manifest = json.loads(response['Body'].read())
+    return {'image_variants': manifest['variants'], 'thumbnail_url': manifest['thumbnail_url']}
+
+def save_image_to_s3(image_data):
+    """Legacy path for images sent base64 encoded in the POST body; returns (key, URL).
+
+    The object is named after the SHA-256 of its content, so an image that is already
+    stored is only touched instead of written again. The image is decoded a chunk at a
+    time, once to hash it and once while uploading, so the decoded bytes are never
+    held in memory all at once.
+    """
+    try:
+        digest = hashlib.sha256()
+        for chunk in iter_decoded(image_data):
+            digest.update(chunk)
+        image_filename = f"{IMAGE_PREFIX}{digest.hexdigest()}.jpg"
+
+        if not touch_image(image_filename):
+            s3.upload_fileobj(
+                Base64Reader(image_data),
+                S3_BUCKET_NAME,
+                image_filename,
+                ExtraArgs={'ContentType': 'image/jpeg', 'CacheControl': IMAGE_CACHE_CONTROL},
+                Config=IMAGE_TRANSFER_CONFIG
+            )
         
         image_url = f"https://{S3_BUCKET_NAME}.s3.amazonaws.com/{image_filename}"
-        return image_url
+        return image_filename, image_url
     except Exception as e:
         raise Exception(f"Error saving image to S3: {str(e)}")
\ No newline at end of file
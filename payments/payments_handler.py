@@ -4,6 +4,11 @@ import boto3
 from botocore.exceptions import ClientError
 import uuid
 from datetime import datetime
+from scan_engine import parallel_scan
+from http_utils import get_header, get_body, compress_response
+from json_encoder import DecimalEncoder
+from projection import parse_fields, build_projection
+from idempotency import idempotent
 
 # Environment Variables
 PAYMENTS_TABLE = os.getenv('PAYMENTS_TABLE', None)
@@ -16,15 +21,20 @@ def create_cors_response(status_code, body):
         'statusCode': status_code,
         'headers': {
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Amz-Api-Key,X-Amz-Security-Token',
+            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Amz-Api-Key,X-Amz-Security-Token,Idempotency-Key',
             'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
             'Access-Control-Allow-Credentials': 'false'
         },
-        'body': json.dumps(body) if body else ''
+        'body': json.dumps(body, cls=DecimalEncoder) if body else ''
     }
 
 # Lambda Handler function
 def lambda_handler(event, context):
+    response = route_request(event)
+    return compress_response(response, get_header(event, 'Accept-Encoding'), get_header(event, 'Accept'))
+
+# Dispatch the request to the matching route
+def route_request(event):
     try:
         method = event['httpMethod']
         path = event['resource']
@@ -32,13 +42,13 @@ def lambda_handler(event, context):
         if method == 'OPTIONS':
             return create_cors_response(200, None)
 
-        # Handle POST request for creating a payment
+        # Handle POST request for creating a payment, at most once per Idempotency-Key
         if method == 'POST' and path == '/payments':
-            return create_payment(event)
+            return idempotent(event, create_payment, create_cors_response)
         
         # Handle GET request to fetch all payments
         elif method == 'GET' and path == '/payments':
-            return get_payments()
+            return get_payments(event.get('queryStringParameters') or {})
         
         # Handle DELETE request for canceling a specific payment by payment_id
         elif method == 'DELETE' and '/payments/' in path:
@@ -56,7 +66,7 @@ def lambda_handler(event, context):
 def create_payment(event):
     try:
         # Parse the request body to get payment details
-        body = json.loads(event['body'])
+        body = json.loads(get_body(event))
         facility_id = body['facility_id']
         booking_id = body['booking_id']
         payment_amount = body['payment_amount']
@@ -88,12 +98,17 @@ def create_payment(event):
     except ClientError as e:
         return create_cors_response(500, {'error': str(e)})
 
-# Function to get all payments
-def get_payments():
+# Function to get all payments, optionally only the attributes listed in ?fields=
+def get_payments(query_params):
     try:
-        # Scan the payments table and retrieve all payments
-        response = payments_table.scan()
-        return create_cors_response(200, response.get('Items', []))
+        fields = parse_fields(query_params)
+        scan_params = build_projection(fields) if fields else {}
+
+        # Scan every segment of the payments table in parallel and retrieve all payments
+        return create_cors_response(200, list(parallel_scan(payments_table, **scan_params)))
+    
+    except ValueError as e:
+        return create_cors_response(400, {'error': str(e)})
     
     except ClientError as e:
         return create_cors_response(500, {'error': str(e)})
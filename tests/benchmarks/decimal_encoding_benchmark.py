@@ -0,0 +1,70 @@
+import decimal
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'common'))
+
+from json_encoder import DecimalEncoder
+
+"""
+Compares the old convert_decimal() + json.dumps path with the single-pass DecimalEncoder
+on facility-shaped items, as returned by a DynamoDB scan.
+Run with: python tests/benchmarks/decimal_encoding_benchmark.py
+"""
+
+
+def convert_decimal(obj):
+    """The recursive copy the services used before DecimalEncoder."""
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    elif isinstance(obj, dict):
+        return {key: convert_decimal(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_decimal(item) for item in obj]
+    else:
+        return obj
+
+
+def make_items(count):
+    return [
+        {
+            'facility_id': f"facility-{n}",
+            'facility_name': 'SecureVault',
+            'location': 'Johannesburg',
+            'type': 'Locker',
+            'image_url': f"https://storage-facilities-images-2024.s3.amazonaws.com/images/{n}.jpg",
+            'capacity': decimal.Decimal(n % 100),
+            'price': decimal.Decimal(50 + n % 10 * 20),
+            'rating': decimal.Decimal('4.5'),
+            'description': 'A secure and compact storage solution for small items.'
+        }
+        for n in range(count)
+    ]
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    print(f"{'items':>8} {'convert_decimal':>16} {'DecimalEncoder':>16} {'speedup':>8} {'old peak':>10} {'new peak':>10}")
+    for count in (1000, 10000, 100000):
+        items = make_items(count)
+        old = lambda: json.dumps(convert_decimal(items))
+        new = lambda: json.dumps(items, cls=DecimalEncoder)
+        repeat = max(1, 100000 // count)
+        old_time = min(timeit.repeat(old, number=repeat, repeat=3)) / repeat
+        new_time = min(timeit.repeat(new, number=repeat, repeat=3)) / repeat
+        print(f"{count:>8} {old_time * 1000:>13.1f} ms {new_time * 1000:>13.1f} ms {old_time / new_time:>7.2f}x "
+              f"{peak_memory(old) / 2 ** 20:>7.1f} MB {peak_memory(new) / 2 ** 20:>7.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
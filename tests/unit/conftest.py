@@ -0,0 +1,22 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# In Lambda the service modules and the CommonLayer modules are importable by bare
+# name, so put their directories on the path the same way
+for directory in ('common', 'facilities', 'users'):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+# The modules create their boto3 clients and tables at import time; nothing here
+# talks to AWS, the tests swap in fakes where a call would be made
+for name, value in {
+    'AWS_DEFAULT_REGION': 'eu-west-1',
+    'FACILITIES_TABLE': 'test-facilities',
+    'USERS_TABLE': 'test-users',
+    'S3_BUCKET_NAME': 'test-bucket',
+    'CATALOG_META_TABLE': 'test-catalog-meta',
+    'IDEMPOTENCY_TABLE': 'test-idempotency',
+    'IMAGE_CLEANUP_QUEUE_URL': 'https://sqs.eu-west-1.amazonaws.com/123456789012/test-cleanup',
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,52 @@
+import base64
+import random
+
+import pytest
+
+from base64_stream import Base64Reader, iter_decoded
+
+
+def read_all(reader, rng):
+    """Drain a reader with reads of random sizes."""
+    chunks = []
+    while True:
+        chunk = reader.read(rng.randint(1, 300))
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+
+@pytest.mark.parametrize('size', [0, 1, 2, 3, 4, 5, 1000, 4099])
+@pytest.mark.parametrize('chunk_chars', [4, 5, 7, 64])
+def test_incomplete_quanta_carry_over_between_chunks(size, chunk_chars):
+    rng = random.Random(size * 100 + chunk_chars)
+    data = bytes(rng.getrandbits(8) for _ in range(size))
+    encoded = base64.b64encode(data).decode('ascii')
+
+    assert read_all(Base64Reader(encoded, chunk_chars), rng) == data
+
+
+@pytest.mark.parametrize('chunk_chars', [3, 7, 76, 77])
+def test_line_breaks_are_skipped(chunk_chars):
+    data = bytes(range(256)) * 3
+    encoded = base64.b64encode(data).decode('ascii')
+    wrapped = '\r\n'.join(encoded[start:start + 76] for start in range(0, len(encoded), 76))
+
+    assert Base64Reader(wrapped, chunk_chars).read() == data
+
+
+def test_readinto_fills_the_buffer():
+    reader = Base64Reader(base64.b64encode(b'hello world').decode('ascii'), 5)
+    buffer = bytearray(8)
+
+    assert reader.readinto(buffer) == 8
+    assert bytes(buffer) == b'hello wo'
+    assert reader.read() == b'rld'
+
+
+def test_iter_decoded_yields_every_byte():
+    data = bytes(range(256)) * 1000
+    chunks = list(iter_decoded(base64.b64encode(data).decode('ascii'), chunk_size=1000))
+
+    assert b''.join(chunks) == data
+    assert max(len(chunk) for chunk in chunks) == 1000
@@ -0,0 +1,114 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import storage_facilities
+
+
+class FakeBatchTable:
+    """Table whose BatchGetItem answers out of order and holds some keys back.
+
+    Keys listed in throttled come back unprocessed for the given number of calls.
+    """
+
+    name = 'test-facilities'
+
+    def __init__(self, facility_ids, throttled=None):
+        self.items = {facility_id: {'facility_id': facility_id, 'price': 1} for facility_id in facility_ids}
+        self.throttled = dict(throttled or {})
+        self.requests = []
+        self.meta = SimpleNamespace(client=self)
+
+    def batch_get_item(self, RequestItems):
+        request = RequestItems[self.name]
+        self.requests.append(request)
+        found, unprocessed = [], []
+        for key in request['Keys']:
+            facility_id = key['facility_id']
+            if self.throttled.get(facility_id, 0) > 0:
+                self.throttled[facility_id] -= 1
+                unprocessed.append(key)
+            elif facility_id in self.items:
+                found.append(self.items[facility_id])
+        response = {'Responses': {self.name: list(reversed(found))}}
+        if unprocessed:
+            response['UnprocessedKeys'] = {self.name: dict(request, Keys=unprocessed)}
+        return response
+
+
+@pytest.fixture()
+def use_table(monkeypatch):
+    monkeypatch.setattr(storage_facilities.time, 'sleep', lambda seconds: None)
+
+    def use(table):
+        monkeypatch.setattr(storage_facilities, 'table', table)
+        monkeypatch.setattr(storage_facilities, 'thread_table', lambda shared: table)
+        return table
+    return use
+
+
+def request(facility_ids, fields=None):
+    event = {'httpMethod': 'POST', 'resource': '/facilities/batch-get', 'headers': {},
+             'queryStringParameters': {'fields': fields} if fields else None,
+             'body': json.dumps({'facility_ids': facility_ids})}
+    response = storage_facilities.lambda_handler(event, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def test_items_come_back_in_request_order(use_table):
+    use_table(FakeBatchTable(['a', 'b', 'c']))
+
+    status, body = request(['c', 'ghost', 'a', 'b', 'a'])
+
+    assert status == 200
+    assert [item['facility_id'] for item in body['items']] == ['c', 'a', 'b']
+    assert body['missing'] == ['ghost']
+    assert body['unprocessed'] == []
+
+
+def test_unprocessed_keys_are_retried(use_table):
+    table = use_table(FakeBatchTable(['a', 'b'], throttled={'b': 2}))
+
+    status, body = request(['a', 'b'])
+
+    assert [item['facility_id'] for item in body['items']] == ['a', 'b']
+    assert [key['facility_id'] for key in table.requests[-1]['Keys']] == ['b']
+    assert len(table.requests) == 3
+
+
+def test_keys_still_unprocessed_after_the_last_attempt_are_reported(use_table):
+    use_table(FakeBatchTable(['a', 'b'], throttled={'b': storage_facilities.BATCH_MAX_ATTEMPTS}))
+
+    status, body = request(['a', 'b'])
+
+    assert status == 200
+    assert [item['facility_id'] for item in body['items']] == ['a']
+    assert body['unprocessed'] == ['b']
+    assert body['missing'] == []
+
+
+def test_large_requests_are_split_into_chunks(use_table):
+    facility_ids = [f"f{number:03}" for number in range(250)]
+    table = use_table(FakeBatchTable(facility_ids))
+
+    status, body = request(facility_ids)
+
+    assert [item['facility_id'] for item in body['items']] == facility_ids
+    assert sorted(len(chunk['Keys']) for chunk in table.requests) == [50, 100, 100]
+
+
+def test_sparse_fields_always_read_the_facility_id(use_table):
+    table = use_table(FakeBatchTable(['a']))
+
+    status, body = request(['a'], fields='price')
+
+    assert body['items'] == [{'price': 1}]
+    assert 'facility_id' in table.requests[0]['ExpressionAttributeNames'].values()
+
+
+@pytest.mark.parametrize('facility_ids', ['a', [1], [''], [f"f{n}" for n in range(301)]])
+def test_invalid_id_lists_are_rejected(use_table, facility_ids):
+    use_table(FakeBatchTable([]))
+
+    assert request(facility_ids)[0] == 400
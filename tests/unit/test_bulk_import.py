@@ -0,0 +1,130 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
+
+import storage_facilities
+
+IMAGE_KEY = 'images/' + 'a' * 64 + '.jpg'
+
+
+class FakeDynamoDB:
+    """BatchWriteItem that leaves the first unprocessed_per_call writes of every call unprocessed.
+
+    A chunk containing a facility named 'reject' fails as a whole, the way DynamoDB
+    rejects a batch with an invalid item.
+    """
+
+    def __init__(self, unprocessed_per_call=0, max_unprocessed_calls=0):
+        self.unprocessed_per_call = unprocessed_per_call
+        self.max_unprocessed_calls = max_unprocessed_calls
+        self.calls = []
+        self.written = []
+        self.meta = SimpleNamespace(client=self)
+
+    def batch_write_item(self, RequestItems):
+        writes = RequestItems['test-facilities']
+        self.calls.append(len(writes))
+        if any(write['PutRequest']['Item']['facility_name'] == 'reject' for write in writes):
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'bad item'}}, 'BatchWriteItem')
+        held = self.unprocessed_per_call if len(self.calls) <= self.max_unprocessed_calls else 0
+        self.written.extend(writes[held:])
+        return {'UnprocessedItems': {'test-facilities': writes[:held]}} if held else {}
+
+
+@pytest.fixture()
+def dynamodb(monkeypatch):
+    fake = FakeDynamoDB()
+    bumps = []
+    monkeypatch.setattr(storage_facilities, 'dynamodb', fake)
+    monkeypatch.setattr(storage_facilities, 'table', SimpleNamespace(name='test-facilities'))
+    monkeypatch.setattr(storage_facilities, 'touch_image', lambda image_key: True)
+    monkeypatch.setattr(storage_facilities, 'image_derivatives', lambda image_key: {})
+    monkeypatch.setattr(storage_facilities, 'bump_catalog_version', lambda: bumps.append(1))
+    monkeypatch.setattr(storage_facilities.time, 'sleep', lambda seconds: None)
+    fake.bumps = bumps
+    return fake
+
+
+def facility(name='Garage', **fields):
+    return dict({'facility_name': name, 'location': 'Durban', 'type': 'Garage', 'capacity': 2, 'price': 100,
+                 'image_key': IMAGE_KEY}, **fields)
+
+
+def bulk(body):
+    event = {'httpMethod': 'POST', 'resource': '/facilities/bulk', 'headers': {}, 'body': body}
+    response = storage_facilities.lambda_handler(event, None)
+    return response['statusCode'], json.loads(response['body'])
+
+
+def test_every_row_gets_a_result(dynamodb):
+    rows = [facility(), {'facility_name': 'No price'}, facility(price='cheap'), facility('Second')]
+
+    status, body = bulk(json.dumps(rows))
+
+    assert status == 200
+    assert (body['created'], body['failed']) == (2, 2)
+    assert [result['status'] for result in body['results']] == ['created', 'error', 'error', 'created']
+    assert body['results'][1]['error'] == "Missing required field: 'location'"
+    assert body['results'][2]['error'] == 'price must be a number'
+    assert len(dynamodb.written) == 2
+    assert dynamodb.bumps == [1]
+
+
+def test_ndjson_rows_fail_one_line_at_a_time(dynamodb):
+    text = '\n'.join([json.dumps(facility()), '{not json', '', json.dumps(facility('Other'))])
+
+    status, body = bulk(text)
+
+    assert [result['status'] for result in body['results']] == ['created', 'error', 'created']
+    assert [result['index'] for result in body['results']] == [0, 1, 2]
+
+
+def test_writes_go_in_chunks_of_25(dynamodb):
+    status, body = bulk(json.dumps([facility(f"Garage {number}") for number in range(60)]))
+
+    assert body['created'] == 60
+    assert dynamodb.calls == [25, 25, 10]
+
+
+def test_unprocessed_writes_are_retried(dynamodb):
+    dynamodb.unprocessed_per_call, dynamodb.max_unprocessed_calls = 3, 2
+
+    status, body = bulk(json.dumps([facility(f"Garage {number}") for number in range(5)]))
+
+    assert body['created'] == 5
+    assert dynamodb.calls == [5, 3, 3]
+
+
+def test_writes_still_unprocessed_fail_their_rows(dynamodb):
+    dynamodb.unprocessed_per_call, dynamodb.max_unprocessed_calls = 1, storage_facilities.BATCH_MAX_ATTEMPTS
+
+    status, body = bulk(json.dumps([facility('First'), facility('Second')]))
+
+    assert (body['created'], body['failed']) == (1, 1)
+    assert body['results'][0]['error'] == 'Not written because of throttling, retry this facility'
+
+
+def test_a_rejected_chunk_only_fails_its_own_rows(dynamodb):
+    rows = [facility(f"Garage {number}") for number in range(30)]
+    rows[27] = facility('reject')
+
+    status, body = bulk(json.dumps(rows))
+
+    assert (body['created'], body['failed']) == (25, 5)
+    assert all(result['status'] == 'created' for result in body['results'][:25])
+    assert all(result['error'] == 'An error occurred (ValidationException) when calling the BatchWriteItem operation: bad item'
+               for result in body['results'][25:])
+
+
+def test_nothing_created_means_no_version_bump(dynamodb):
+    status, body = bulk(json.dumps([{'facility_name': 'Incomplete'}]))
+
+    assert body['created'] == 0
+    assert dynamodb.bumps == []
+
+
+@pytest.mark.parametrize('body', ['', '[]', json.dumps([facility()] * (storage_facilities.MAX_BULK_ITEMS + 1))])
+def test_empty_or_oversized_imports_are_rejected(dynamodb, body):
+    assert bulk(body)[0] == 400
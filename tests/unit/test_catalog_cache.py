@@ -0,0 +1,144 @@
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
+
+import storage_facilities
+
+
+class FakeMetaTable:
+    name = 'meta'
+
+    def __init__(self):
+        self.version = 1
+        self.reads = 0
+
+    def get_item(self, Key, ProjectionExpression):
+        self.reads += 1
+        return {'Item': {'meta_id': 'catalog_version', 'version': self.version}}
+
+
+class FakeTransactions:
+    """TransactWriteItems that is cancelled with the queued reasons before it succeeds."""
+
+    def __init__(self):
+        self.failures = []
+        self.calls = []
+        self.meta = SimpleNamespace(client=self)
+
+    def transact_write_items(self, TransactItems):
+        self.calls.append(TransactItems)
+        if self.failures:
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException'},
+                               'CancellationReasons': self.failures.pop(0)}, 'TransactWriteItems')
+
+
+@pytest.fixture()
+def catalog(monkeypatch):
+    meta_table = FakeMetaTable()
+    scans = []
+
+    def parallel_scan(table, **scan_params):
+        scans.append(scan_params)
+        yield from [{'facility_id': 'b'}, {'facility_id': 'a'}]
+
+    monkeypatch.setattr(storage_facilities, 'meta_table', meta_table)
+    monkeypatch.setattr(storage_facilities, 'parallel_scan', parallel_scan)
+    monkeypatch.setattr(storage_facilities, 'version_stamp', {'version': None, 'checked_at': None})
+    monkeypatch.setattr(storage_facilities, 'catalog_cache', {'version': None, 'items': None, 'ids': None})
+    meta_table.scans = scans
+    return meta_table
+
+
+@pytest.fixture()
+def transactions(monkeypatch):
+    fake = FakeTransactions()
+    monkeypatch.setattr(storage_facilities, 'dynamodb', fake)
+    monkeypatch.setattr(storage_facilities, 'meta_table', SimpleNamespace(name='meta'))
+    monkeypatch.setattr(storage_facilities, 'version_stamp', {'version': 1, 'checked_at': 0})
+    monkeypatch.setattr(storage_facilities.time, 'sleep', lambda seconds: None)
+    return fake
+
+
+def test_warm_reads_are_served_from_the_cache(catalog):
+    first = storage_facilities.get_cached_catalog()
+    second = storage_facilities.get_cached_catalog()
+
+    assert [item['facility_id'] for item in first] == ['a', 'b']
+    assert second is first
+    assert len(catalog.scans) == 1
+    assert catalog.scans[0] == {'ConsistentRead': True}
+    # Inside the TTL the version stamp is not read again either
+    assert catalog.reads == 1
+
+
+def test_a_new_version_reloads_the_catalog(catalog):
+    storage_facilities.get_cached_catalog()
+    catalog.version = 2
+    storage_facilities.version_stamp['checked_at'] = None
+
+    storage_facilities.get_cached_catalog()
+
+    assert len(catalog.scans) == 2
+
+
+def test_a_catalog_over_the_byte_limit_is_not_cached(catalog, monkeypatch):
+    monkeypatch.setattr(storage_facilities, 'CATALOG_CACHE_MAX_BYTES', 10)
+
+    assert storage_facilities.get_cached_catalog() is None
+    assert storage_facilities.catalog_cache['version'] == 1
+
+
+def test_catalog_pages_continue_after_the_cursor(catalog):
+    items = [{'facility_id': name} for name in 'abcde']
+    ids = [item['facility_id'] for item in items]
+
+    page, next_key = storage_facilities.get_catalog_page(items, ids, 2, {'facility_id': 'b'})
+
+    assert page == [{'facility_id': 'c'}, {'facility_id': 'd'}]
+    assert next_key == {'facility_id': 'd'}
+    assert storage_facilities.get_catalog_page(items, ids, 2, next_key) == ([{'facility_id': 'e'}], None)
+
+
+def test_catalog_cursor_must_be_a_facility_id():
+    cursor = storage_facilities.encode_cursor({'facility_id': 'abc'})
+    assert storage_facilities.decode_catalog_cursor(cursor) == {'facility_id': 'abc'}
+
+    for key in ({'offset': 50}, {'facility_id': 7}, {'facility_id': 'abc', 'price': 1}):
+        with pytest.raises(ValueError):
+            storage_facilities.decode_catalog_cursor(storage_facilities.encode_cursor(key))
+
+
+def test_a_write_bumps_the_version_in_the_same_transaction(transactions):
+    write = {'Delete': {'TableName': 'facilities', 'Key': {'facility_id': 'a'}}}
+
+    storage_facilities.write_facility(write)
+
+    assert transactions.calls == [[write, storage_facilities.catalog_version_bump()]]
+    assert storage_facilities.version_stamp['checked_at'] is None
+
+
+def test_conflicts_on_the_version_item_are_retried(transactions):
+    transactions.failures = [[{'Code': 'None'}, {'Code': 'TransactionConflict'}]] * 2
+
+    storage_facilities.write_facility({'Delete': {'TableName': 'facilities', 'Key': {'facility_id': 'a'}}})
+
+    assert len(transactions.calls) == 3
+
+
+def test_failed_conditions_are_not_retried(transactions):
+    transactions.failures = [[{'Code': 'ConditionalCheckFailed'}, {'Code': 'TransactionConflict'}]]
+
+    with pytest.raises(ClientError):
+        storage_facilities.write_facility({'Delete': {'TableName': 'facilities', 'Key': {'facility_id': 'a'}}})
+
+    assert len(transactions.calls) == 1
+
+
+def test_conflicts_give_up_after_the_last_attempt(transactions):
+    transactions.failures = [[{'Code': 'None'}, {'Code': 'TransactionConflict'}]] * storage_facilities.BATCH_MAX_ATTEMPTS
+
+    with pytest.raises(ClientError):
+        storage_facilities.write_facility({'Delete': {'TableName': 'facilities', 'Key': {'facility_id': 'a'}}})
+
+    assert len(transactions.calls) == storage_facilities.BATCH_MAX_ATTEMPTS
@@ -0,0 +1,25 @@
+import pytest
+
+import storage_facilities
+
+
+@pytest.mark.parametrize('if_none_match, matches', [
+    (None, False),
+    ('W/"3-abc"', True),
+    ('"3-abc"', True),
+    ('W/"2-abc", W/"3-abc"', True),
+    ('*', True),
+    ('W/"2-abc"', False),
+])
+def test_etags_use_weak_comparison(if_none_match, matches):
+    assert storage_facilities.etag_matches(if_none_match, 'W/"3-abc"') is matches
+
+
+def test_catalog_etag_is_weak_and_follows_the_version(monkeypatch):
+    event = {'resource': '/facilities', 'queryStringParameters': {'limit': '2'}}
+    monkeypatch.setattr(storage_facilities, 'current_catalog_version', lambda: 3)
+    etag = storage_facilities.catalog_etag(event)
+
+    assert etag.startswith('W/"3-')
+    monkeypatch.setattr(storage_facilities, 'current_catalog_version', lambda: 4)
+    assert storage_facilities.catalog_etag(event) != etag
@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+import facets
+
+serializer = TypeSerializer()
+
+
+def image(facility):
+    return {name: serializer.serialize(value) for name, value in facility.items()}
+
+
+def record(event_id, old=None, new=None):
+    images = {}
+    if old is not None:
+        images['OldImage'] = image(old)
+    if new is not None:
+        images['NewImage'] = image(new)
+    return {'eventID': event_id, 'dynamodb': images}
+
+
+GARAGE = {'facility_id': 'a', 'location': 'Durban', 'type': 'Garage', 'price': 900}
+LOCKER = {'facility_id': 'b', 'location': 'George', 'type': 'Locker', 'price': 50}
+
+
+@pytest.mark.parametrize('price, band', [(0, '0-99'), (99, '0-99'), (100, '100-249'), (4999, '2500-4999'), (5000, '5000+'), (-1, '0-99')])
+def test_price_band(price, band):
+    assert facets.price_band(price) == band
+
+
+def test_insert_counts_up():
+    assert facets.facet_deltas([record('1', new=GARAGE)]) == {
+        'location|Durban': 1, 'type|Garage': 1, 'price_band|500-999': 1, 'total': 1}
+
+
+def test_modify_moves_between_counters():
+    moved = dict(LOCKER, location='Durban')
+
+    assert facets.facet_deltas([record('1', old=LOCKER, new=moved)]) == {'location|George': -1, 'location|Durban': 1}
+
+
+def test_changes_that_cancel_out_are_dropped():
+    records = [record('1', new=GARAGE), record('2', new=LOCKER), record('3', old=GARAGE)]
+
+    assert facets.facet_deltas(records) == {'location|George': 1, 'type|Locker': 1, 'price_band|0-99': 1, 'total': 1}
+
+
+def test_missing_attributes_are_not_counted():
+    assert facets.facet_deltas([record('1', new={'facility_id': 'x'})]) == {'total': 1}
+
+
+class FakeMetaTable:
+    """Catalog meta table that applies the facets transaction like DynamoDB would."""
+
+    name = 'meta'
+
+    def __init__(self):
+        self.items = {}
+        self.meta = SimpleNamespace(client=self)
+
+    def transact_write_items(self, TransactItems):
+        put, update = TransactItems[0]['Put'], TransactItems[1]['Update']
+        if put['Item']['meta_id'] in self.items:
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException'},
+                               'CancellationReasons': [{'Code': 'ConditionalCheckFailed'}, {'Code': 'None'}]},
+                              'TransactWriteItems')
+        self.items[put['Item']['meta_id']] = put['Item']
+        counts = self.items.setdefault(update['Key']['meta_id'], {'meta_id': update['Key']['meta_id']})
+        for placeholder, name in update['ExpressionAttributeNames'].items():
+            counts[name] = counts.get(name, 0) + update['ExpressionAttributeValues'][':' + placeholder[1:]]
+
+    def get_item(self, Key):
+        return {'Item': self.items[Key['meta_id']]} if Key['meta_id'] in self.items else {}
+
+
+def test_retried_batch_is_applied_once():
+    meta_table = FakeMetaTable()
+    records = [record('1', new=GARAGE), record('2', new=LOCKER)]
+
+    for _ in range(2):
+        facets.apply_deltas(meta_table, facets.facet_deltas(records), facets.batch_id(records))
+
+    assert facets.read_facets(meta_table) == {
+        'location': {'Durban': 1, 'George': 1},
+        'type': {'Garage': 1, 'Locker': 1},
+        'price_band': {'500-999': 1, '0-99': 1},
+        'total': 2,
+    }
+
+
+def test_batch_id_depends_on_the_records():
+    first, second = [record('1', new=GARAGE)], [record('2', new=GARAGE)]
+
+    assert facets.batch_id(first) == facets.batch_id([record('1', new=LOCKER)])
+    assert facets.batch_id(first) != facets.batch_id(second)
@@ -0,0 +1,55 @@
+import math
+
+import pytest
+
+import geohash
+
+
+def test_encode_known_cell():
+    # The canonical example from the geohash specification
+    assert geohash.encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+
+
+def test_cell_size_halves_alternately():
+    assert geohash.cell_size(1) == (45.0, 45.0)
+    assert geohash.cell_size(2) == (45.0 / 8, 45.0 / 4)
+
+
+def circle_points(lat, lng, radius_km, count=72):
+    """Points on a circle around a coordinate, just inside radius_km."""
+    for step in range(count):
+        angle = 2 * math.pi * step / count
+        lat_offset = 0.999 * radius_km * math.cos(angle) / geohash.KM_PER_DEGREE_LAT
+        lng_offset = 0.999 * radius_km * math.sin(angle) / (geohash.KM_PER_DEGREE_LAT * math.cos(math.radians(lat)))
+        yield lat + lat_offset, lng + lng_offset
+
+
+@pytest.mark.parametrize('lat, lng, radius_km, precision', [
+    (-33.9249, 18.4241, 10, 5),
+    (-29.8587, 31.0218, 25, 4),
+    (0.0001, -0.0001, 5, 5),
+    (64.1466, -21.9426, 50, 4),
+])
+def test_covering_cells_contain_the_whole_circle(lat, lng, radius_km, precision):
+    cells = geohash.covering_cells(lat, lng, radius_km, precision)
+
+    assert geohash.encode(lat, lng, precision) in cells
+    for point_lat, point_lng in circle_points(lat, lng, radius_km):
+        assert geohash.encode(point_lat, point_lng, precision) in cells
+    assert all(len(cell) == precision for cell in cells)
+
+
+def test_covering_cells_stay_near_the_circle():
+    cells = geohash.covering_cells(-33.9249, 18.4241, 10, 5)
+    cell_lat, cell_lng = geohash.cell_size(5)
+    min_lat, max_lat, min_lng, max_lng = geohash.bounding_box(-33.9249, 18.4241, 10)
+
+    rows = math.ceil((max_lat - min_lat) / cell_lat) + 1
+    columns = math.ceil((max_lng - min_lng) / cell_lng) + 1
+    assert len(cells) <= rows * columns
+
+
+def test_distance_km():
+    # Cape Town to Johannesburg is about 1,270 km as the crow flies
+    assert geohash.distance_km(-33.9249, 18.4241, -26.2041, 28.0473) == pytest.approx(1265, abs=15)
+    assert geohash.distance_km(1, 2, 1, 2) == 0
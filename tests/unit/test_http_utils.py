@@ -0,0 +1,89 @@
+import base64
+import gzip
+
+import pytest
+
+import http_utils
+
+
+@pytest.fixture()
+def without_brotli(monkeypatch):
+    monkeypatch.setattr(http_utils, 'brotli', None)
+
+
+@pytest.fixture()
+def with_brotli(monkeypatch):
+    monkeypatch.setattr(http_utils, 'brotli', object())
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    (None, None),
+    ('', None),
+    ('gzip, deflate', 'gzip'),
+    ('GZIP', 'gzip'),
+    ('identity', None),
+    ('gzip;q=0', None),
+    ('gzip;q=0.5, *;q=0', 'gzip'),
+    ('*', 'gzip'),
+    ('*;q=0.1, gzip;q=0', None),
+    ('gzip;q=oops', None),
+    ('br', None),
+])
+def test_choose_encoding_without_brotli(without_brotli, accept_encoding, expected):
+    assert http_utils.choose_encoding(accept_encoding) == expected
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('gzip, deflate, br', 'br'),
+    ('br;q=0.5, gzip;q=0.8', 'gzip'),
+    ('br;q=0.8, gzip;q=0.8', 'br'),
+    ('br;q=0, gzip', 'gzip'),
+    ('*', 'br'),
+])
+def test_choose_encoding_prefers_brotli_on_ties(with_brotli, accept_encoding, expected):
+    assert http_utils.choose_encoding(accept_encoding) == expected
+
+
+def test_get_header_is_case_insensitive():
+    event = {'headers': {'accept-encoding': 'gzip'}}
+
+    assert http_utils.get_header(event, 'Accept-Encoding') == 'gzip'
+    assert http_utils.get_header({'headers': None}, 'Accept-Encoding') is None
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, False),
+    ('*/*', False),
+    ('application/json', False),
+    ('application/vnd.flexistore+json', True),
+    ('Application/Vnd.Flexistore+JSON; q=1, */*', True),
+    ('application/json, application/vnd.flexistore+json', False),
+])
+def test_accepts_compressed_checks_the_first_media_range(accept, expected):
+    assert http_utils.accepts_compressed(accept) is expected
+
+
+def test_small_bodies_are_not_compressed(without_brotli):
+    response = http_utils.compress_response({'statusCode': 200, 'body': 'x' * 10}, 'gzip', http_utils.COMPRESSED_MEDIA_TYPE)
+
+    assert response['body'] == 'x' * 10
+    assert response['isBase64Encoded'] is False
+    assert response['headers']['Vary'] == 'Accept, Accept-Encoding'
+
+
+def test_bodies_are_not_compressed_without_the_binary_accept_type(without_brotli):
+    body = 'facility ' * 500
+    response = http_utils.compress_response({'statusCode': 200, 'body': body}, 'gzip', '*/*')
+
+    # API Gateway would pass a base64 body for this Accept through undecoded
+    assert response['body'] == body
+    assert response['isBase64Encoded'] is False
+
+
+def test_large_bodies_are_gzipped(without_brotli):
+    body = 'facility ' * 500
+    response = http_utils.compress_response({'statusCode': 200, 'body': body}, 'gzip', http_utils.COMPRESSED_MEDIA_TYPE)
+
+    assert response['isBase64Encoded'] is True
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(base64.b64decode(response['body'])).decode('utf-8') == body
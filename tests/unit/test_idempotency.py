@@ -0,0 +1,160 @@
+import json
+
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+import idempotency
+
+serializer = TypeSerializer()
+
+
+class FakeIdempotencyTable:
+    """Evaluates idempotent()'s conditional put the way DynamoDB would."""
+
+    def __init__(self):
+        self.records = {}
+
+    def put_item(self, Item, ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues,
+                 ReturnValuesOnConditionCheckFailure):
+        now = ExpressionAttributeValues[':now']
+        old = self.records.get(Item['idempotency_key'])
+        if (old is None or old['expires_at'] < now
+                or (old['status'] == idempotency.IN_PROGRESS and old['locked_until'] < now)):
+            self.records[Item['idempotency_key']] = dict(Item)
+            return {}
+        raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException'},
+                           'Item': {name: serializer.serialize(value) for name, value in old.items()}}, 'PutItem')
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        record = self.records[Key['idempotency_key']]
+        record['status'] = ExpressionAttributeValues[':completed']
+        record['response'] = ExpressionAttributeValues[':response']
+
+    def delete_item(self, Key):
+        self.records.pop(Key['idempotency_key'], None)
+
+
+@pytest.fixture()
+def table(monkeypatch):
+    table = FakeIdempotencyTable()
+    monkeypatch.setattr(idempotency, 'idempotency_table', table)
+    return table
+
+
+def create_response(status_code, body):
+    return {'statusCode': status_code, 'headers': {}, 'body': json.dumps(body)}
+
+
+def event(body='{"price": 1}', key='key-1'):
+    headers = {'Idempotency-Key': key} if key else {}
+    return {'httpMethod': 'POST', 'resource': '/facilities', 'headers': headers, 'body': body}
+
+
+class Handler:
+    """Write handler that counts its calls and answers with a canned status."""
+
+    def __init__(self, status_code=201):
+        self.status_code = status_code
+        self.calls = 0
+
+    def __call__(self, event):
+        self.calls += 1
+        return create_response(self.status_code, {'call': self.calls})
+
+
+def test_requests_without_a_key_are_not_recorded(table):
+    handler = Handler()
+
+    idempotency.idempotent(event(key=None), handler, create_response)
+    idempotency.idempotent(event(key=None), handler, create_response)
+
+    assert handler.calls == 2
+    assert table.records == {}
+
+
+def test_a_retry_replays_the_stored_response(table):
+    handler = Handler()
+
+    first = idempotency.idempotent(event(), handler, create_response)
+    second = idempotency.idempotent(event(), handler, create_response)
+
+    assert handler.calls == 1
+    assert second['statusCode'] == 201
+    assert second['body'] == first['body']
+    assert second['headers']['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first['headers']
+
+
+def test_keys_are_scoped_to_the_route(table):
+    handler = Handler()
+    other_route = dict(event(), resource='/facilities/bulk')
+
+    idempotency.idempotent(event(), handler, create_response)
+    idempotency.idempotent(other_route, handler, create_response)
+
+    assert handler.calls == 2
+
+
+def test_reusing_a_key_for_another_body_is_rejected(table):
+    handler = Handler()
+
+    idempotency.idempotent(event(), handler, create_response)
+    response = idempotency.idempotent(event(body='{"price": 2}'), handler, create_response)
+
+    assert response['statusCode'] == 422
+    assert handler.calls == 1
+
+
+def test_a_retry_while_the_first_request_runs_gets_409(table):
+    responses = []
+
+    def handler(request):
+        responses.append(idempotency.idempotent(event(), Handler(), create_response))
+        return create_response(201, {})
+
+    idempotency.idempotent(event(), handler, create_response)
+
+    assert responses[0]['statusCode'] == 409
+
+
+def test_an_abandoned_lock_can_be_taken_over(table):
+    handler = Handler()
+    table.records['POST /facilities key-1'] = {
+        'idempotency_key': 'POST /facilities key-1', 'status': idempotency.IN_PROGRESS,
+        'payload_hash': 'stale', 'locked_until': 0, 'expires_at': 2 ** 40}
+
+    response = idempotency.idempotent(event(), handler, create_response)
+
+    assert response['statusCode'] == 201
+    assert handler.calls == 1
+
+
+def test_server_errors_are_not_stored(table):
+    failing = Handler(status_code=503)
+
+    assert idempotency.idempotent(event(), failing, create_response)['statusCode'] == 503
+    assert table.records == {}
+
+    handler = Handler()
+    assert idempotency.idempotent(event(), handler, create_response)['statusCode'] == 201
+    assert handler.calls == 1
+
+
+def test_exceptions_release_the_key(table):
+    def handler(request):
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        idempotency.idempotent(event(), handler, create_response)
+
+    assert table.records == {}
+
+
+def test_overlong_keys_are_rejected(table):
+    handler = Handler()
+
+    response = idempotency.idempotent(event(key='k' * (idempotency.MAX_KEY_LENGTH + 1)), handler, create_response)
+
+    assert response['statusCode'] == 400
+    assert handler.calls == 0
@@ -0,0 +1,44 @@
+import decimal
+import json
+
+import pytest
+
+from json_encoder import DecimalEncoder
+
+
+def dumps(value):
+    return json.dumps(value, cls=DecimalEncoder)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (decimal.Decimal('50'), '50'),
+    (decimal.Decimal('50.0'), '50'),
+    (decimal.Decimal('-3'), '-3'),
+    (decimal.Decimal('12.5'), '12.5'),
+    (decimal.Decimal('0.1'), '0.1'),
+    (decimal.Decimal('1E+2'), '100'),
+])
+def test_decimals_become_plain_numbers(value, expected):
+    assert dumps(value) == expected
+
+
+def test_integral_decimals_stay_integers_after_a_round_trip():
+    assert json.loads(dumps({'price': decimal.Decimal(900)}))['price'] == 900
+    assert isinstance(json.loads(dumps({'price': decimal.Decimal(900)}))['price'], int)
+
+
+def test_nested_items_and_sets_are_encoded():
+    item = {
+        'facility_id': 'a',
+        'image_variants': [{'width': decimal.Decimal(320), 'url': 'u'}],
+        'tags': {'dry'},
+        'sizes': frozenset([decimal.Decimal(2)]),
+    }
+
+    assert json.loads(dumps(item)) == {'facility_id': 'a', 'image_variants': [{'width': 320, 'url': 'u'}],
+                                       'tags': ['dry'], 'sizes': [2]}
+
+
+def test_other_types_still_fail():
+    with pytest.raises(TypeError):
+        dumps(object())
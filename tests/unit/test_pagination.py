@@ -0,0 +1,21 @@
+import decimal
+
+import pytest
+
+import storage_facilities
+
+
+def test_cursor_round_trip():
+    key = {'facility_id': 'abc', 'price': decimal.Decimal('12.5')}
+    cursor = storage_facilities.encode_cursor(key)
+
+    assert '=' not in cursor
+    assert storage_facilities.decode_cursor(cursor) == key
+    assert storage_facilities.encode_cursor(None) is None
+
+
+@pytest.mark.parametrize('cursor', ['not base64!', 'W10', 'e30'])
+def test_malformed_cursors_are_rejected(cursor):
+    # 'W10' is [] and 'e30' is {}
+    with pytest.raises(ValueError):
+        storage_facilities.decode_cursor(cursor)
@@ -0,0 +1,79 @@
+import threading
+
+import pytest
+
+import scan_engine
+
+
+class FakeTable:
+    """Table split into segments of page_count pages, each page_size items long."""
+
+    name = 'test-table'
+
+    def __init__(self, page_count=3, page_size=10):
+        self.page_count = page_count
+        self.page_size = page_size
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def scan(self, Segment, TotalSegments, ExclusiveStartKey=None, **scan_params):
+        with self.lock:
+            self.calls.append(dict(scan_params, Segment=Segment, TotalSegments=TotalSegments))
+        page = ExclusiveStartKey['page'] if ExclusiveStartKey else 0
+        response = {'Items': [{'id': f"{Segment}-{page}-{index}"} for index in range(self.page_size)]}
+        if page + 1 < self.page_count:
+            response['LastEvaluatedKey'] = {'page': page + 1}
+        return response
+
+
+@pytest.fixture(autouse=True)
+def shared_tables(monkeypatch):
+    # Workers would build real boto3 tables; hand them the fake instead
+    threads = set()
+
+    def thread_table(table):
+        threads.add(threading.get_ident())
+        return table
+
+    monkeypatch.setattr(scan_engine, 'thread_table', thread_table)
+    return threads
+
+
+def test_every_segment_is_read_to_the_end():
+    table = FakeTable()
+
+    items = list(scan_engine.parallel_scan(table, total_segments=4, max_buffered_items=5, ConsistentRead=True))
+
+    assert len(items) == 4 * 3 * 10
+    assert len({item['id'] for item in items}) == len(items)
+    assert {call['Segment'] for call in table.calls} == {0, 1, 2, 3}
+    assert all(call['TotalSegments'] == 4 and call['ConsistentRead'] for call in table.calls)
+
+
+def test_workers_read_through_their_own_tables(shared_tables):
+    list(scan_engine.parallel_scan(FakeTable(), total_segments=4))
+
+    assert threading.get_ident() not in shared_tables
+
+
+def test_closing_early_stops_the_workers():
+    table = FakeTable(page_count=1000)
+    scan = scan_engine.parallel_scan(table, total_segments=2, max_buffered_items=2)
+
+    next(scan)
+    scan.close()
+
+    assert len(table.calls) < 1000
+
+
+def test_segment_errors_reach_the_caller():
+    class FailingTable(FakeTable):
+        def scan(self, **scan_params):
+            raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError, match='boom'):
+        list(scan_engine.parallel_scan(FailingTable(), total_segments=2))
+
+
+def test_concurrent_map_keeps_the_order():
+    assert scan_engine.concurrent_map(lambda value: value * 2, range(20)) == [value * 2 for value in range(20)]
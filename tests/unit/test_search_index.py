@@ -0,0 +1,65 @@
+import decimal
+
+import pytest
+
+import search_index
+
+FACILITIES = [
+    {'facility_id': 'a', 'facility_name': 'Secure Garage', 'description': 'Dry and alarmed', 'location': 'Cape Town', 'type': 'Garage', 'price': decimal.Decimal(900)},
+    {'facility_id': 'b', 'facility_name': 'Box Locker', 'description': 'Small garage-sized locker', 'location': 'Durban', 'type': 'Locker', 'price': decimal.Decimal(50)},
+    {'facility_id': 'c', 'facility_name': 'Harbour Warehouse', 'description': 'Space for a boat', 'location': 'Cape Town', 'type': 'Warehouse', 'price': decimal.Decimal(4000)},
+    {'facility_id': 'd', 'facility_name': 'Town Storage', 'description': '', 'location': 'George', 'type': 'Garage', 'price': decimal.Decimal(300)},
+]
+
+
+@pytest.fixture()
+def index():
+    return search_index.build_index(FACILITIES, version=3)
+
+
+def ids(matches):
+    return [doc['facility_id'] for _, doc in matches]
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert search_index.tokenize('The Garage, in Cape-Town!') == ['garage', 'cape', 'town']
+
+
+def test_name_matches_rank_above_description_matches(index):
+    matches = search_index.search(index, 'garage')
+
+    # facility_name counts twice, so the garages named as such come first
+    assert ids(matches)[-1] == 'b'
+    assert set(ids(matches)) == {'a', 'b', 'd'}
+    assert [score for score, _ in matches] == sorted((score for score, _ in matches), reverse=True)
+
+
+def test_partial_words_match_as_prefixes(index):
+    assert ids(search_index.search(index, 'wareh')) == ['c']
+    assert search_index.search(index, 'zzz') == []
+
+
+def test_predicate_filters_matches(index):
+    matches = search_index.search(index, 'garage', lambda doc: doc['price'] < 500)
+
+    assert set(ids(matches)) == {'b', 'd'}
+
+
+def test_index_survives_a_round_trip_through_s3_format(index):
+    loaded = search_index.load_index(search_index.dump_index(index))
+
+    assert loaded['version'] == 3
+    assert ids(search_index.search(loaded, 'cape storage')) == ids(search_index.search(index, 'cape storage'))
+
+
+def test_empty_catalog():
+    empty = search_index.build_index([], version=0)
+
+    assert search_index.search(empty, 'garage') == []
+
+
+def test_documents_keep_only_the_filter_and_suggest_fields(index):
+    assert index['docs'][0] == {
+        'facility_id': 'a', 'facility_name': 'Secure Garage', 'location': 'Cape Town', 'type': 'Garage',
+        'price': decimal.Decimal(900)}
+    assert 'description' not in search_index.load_index(search_index.dump_index(index))['docs'][1]
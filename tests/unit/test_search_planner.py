@@ -0,0 +1,90 @@
+import decimal
+
+import pytest
+from boto3.dynamodb.conditions import ConditionExpressionBuilder
+
+import storage_facilities
+
+
+def render(condition, is_key_condition=False):
+    """Render a boto3 condition as its expression with the placeholders filled back in."""
+    expression = ConditionExpressionBuilder().build_expression(condition, is_key_condition=is_key_condition)
+    text = expression.condition_expression
+    for placeholder, name in expression.attribute_name_placeholders.items():
+        text = text.replace(placeholder, name)
+    for placeholder, value in expression.attribute_value_placeholders.items():
+        text = text.replace(placeholder, repr(value))
+    return text
+
+
+def test_location_and_type_use_the_composite_index():
+    strategy, params = storage_facilities.plan_search({'location': 'Durban', 'type': 'Garage'})
+
+    assert strategy == 'query'
+    assert params['IndexName'] == 'LocationTypeIndex'
+    assert render(params['KeyConditionExpression'], True) == "location_type = 'Durban#Garage'"
+    assert 'FilterExpression' not in params
+
+
+def test_price_range_becomes_part_of_the_key_condition():
+    ranges = {'price': (decimal.Decimal(100), decimal.Decimal(500))}
+    strategy, params = storage_facilities.plan_search({'location': 'Durban'}, ranges)
+
+    assert strategy == 'query'
+    assert params['IndexName'] == 'LocationIndex'
+    assert render(params['KeyConditionExpression'], True) == (
+        "(location = 'Durban' AND price BETWEEN Decimal('100') AND Decimal('500'))")
+    assert 'FilterExpression' not in params
+
+
+def test_fields_outside_the_index_key_are_filtered():
+    ranges = {'price': (decimal.Decimal(100), None), 'capacity': (None, decimal.Decimal(10))}
+    strategy, params = storage_facilities.plan_search({'type': 'Locker', 'facility_name': 'Box'}, ranges)
+
+    assert strategy == 'query'
+    assert params['IndexName'] == 'TypeIndex'
+    assert render(params['KeyConditionExpression'], True) == "(type = 'Locker' AND price >= Decimal('100'))"
+    assert render(params['FilterExpression']) == "(facility_name = 'Box' AND capacity <= Decimal('10'))"
+
+
+def test_descending_order_reverses_the_index():
+    _, params = storage_facilities.plan_search({'location': 'Durban'}, sort='price', order='desc')
+
+    assert params['ScanIndexForward'] is False
+
+
+def test_sort_without_a_matching_index_is_done_in_memory():
+    strategy, params = storage_facilities.plan_search({'location': 'Durban'}, sort='capacity')
+
+    assert strategy == 'sort'
+    assert render(params['FilterExpression']) == "location = 'Durban'"
+
+
+def test_no_indexed_criteria_fall_back_to_a_scan():
+    strategy, params = storage_facilities.plan_search({'facility_name': 'Box'})
+
+    assert strategy == 'scan'
+    assert render(params['FilterExpression']) == "facility_name = 'Box'"
+    assert storage_facilities.plan_search({}) == ('scan', {})
+
+
+def test_search_cursor_must_match_the_planned_index():
+    ranges = {'price': (None, decimal.Decimal(100))}
+    _, params = storage_facilities.plan_search({'location': 'Durban'}, ranges)
+    key = {'facility_id': 'a', 'location': 'Durban', 'price': 50}
+
+    assert storage_facilities.decode_search_cursor(
+        storage_facilities.encode_cursor(key), params, {'location': 'Durban'}, ranges) == key
+    for forged in ({'offset': 4}, {'facility_id': 'a'}, dict(key, location='Cape Town'), dict(key, price=500),
+                   dict(key, price='50'), dict(key, type='Garage')):
+        with pytest.raises(ValueError):
+            storage_facilities.decode_search_cursor(
+                storage_facilities.encode_cursor(forged), params, {'location': 'Durban'}, ranges)
+
+
+def test_scan_cursor_must_be_a_table_key():
+    _, params = storage_facilities.plan_search({'facility_name': 'Box'})
+
+    with pytest.raises(ValueError):
+        storage_facilities.decode_search_cursor(
+            storage_facilities.encode_cursor({'offset': 4}), params, {}, {})
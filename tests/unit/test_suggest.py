@@ -0,0 +1,36 @@
+import decimal
+
+import pytest
+
+import search_index
+
+FACILITIES = [
+    {'facility_id': 'a', 'facility_name': 'Secure Garage', 'description': 'Dry and alarmed', 'location': 'Cape Town', 'type': 'Garage', 'price': decimal.Decimal(900)},
+    {'facility_id': 'b', 'facility_name': 'Box Locker', 'description': 'Small garage-sized locker', 'location': 'Durban', 'type': 'Locker', 'price': decimal.Decimal(50)},
+    {'facility_id': 'c', 'facility_name': 'Harbour Warehouse', 'description': 'Space for a boat', 'location': 'Cape Town', 'type': 'Warehouse', 'price': decimal.Decimal(4000)},
+    {'facility_id': 'd', 'facility_name': 'Town Storage', 'description': '', 'location': 'George', 'type': 'Garage', 'price': decimal.Decimal(300)},
+]
+
+
+@pytest.fixture()
+def index():
+    return search_index.build_index(FACILITIES, version=3)
+
+
+def test_suggest_matches_any_word_start(index):
+    assert search_index.suggest(index, 'town', 5) == [
+        {'text': 'Cape Town', 'field': 'location'},
+        {'text': 'Town Storage', 'field': 'facility_name'},
+    ]
+
+
+def test_suggest_ranks_common_values_first_and_limits(index):
+    suggestions = search_index.suggest(index, 'c', 1)
+
+    # Two facilities are in Cape Town
+    assert suggestions == [{'text': 'Cape Town', 'field': 'location'}]
+    assert search_index.suggest(index, '  ', 5) == []
+
+
+def test_empty_catalog_has_no_suggestions():
+    assert search_index.suggest(search_index.build_index([], version=0), 'ga', 5) == []
@@ -0,0 +1,169 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
+
+import storage_facilities
+
+OLD_IMAGE = 'images/' + 'a' * 64 + '.jpg'
+NEW_IMAGE = 'images/' + 'b' * 64 + '.jpg'
+VARIANTS = {'image_variants': {'small': 'https://example.com/small.webp'}, 'thumbnail_url': 'https://example.com/thumb.webp'}
+
+
+class FakeDynamoDB:
+    """Records facility transactions, or cancels them with the given reasons."""
+
+    def __init__(self):
+        self.transactions = []
+        self.reasons = None
+        self.meta = SimpleNamespace(client=self)
+
+    def transact_write_items(self, TransactItems):
+        if self.reasons is not None:
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException'},
+                               'CancellationReasons': self.reasons}, 'TransactWriteItems')
+        self.transactions.append(TransactItems)
+
+
+class FakeTable:
+    name = 'facilities'
+
+    def __init__(self, item):
+        self.item = item
+        self.reads = []
+
+    def get_item(self, Key, ProjectionExpression, ExpressionAttributeNames, ConsistentRead):
+        self.reads.append(sorted(ExpressionAttributeNames.values()))
+        fields = ExpressionAttributeNames.values()
+        return {'Item': {field: self.item[field] for field in fields if field in self.item}}
+
+
+@pytest.fixture()
+def dynamodb(monkeypatch):
+    fake = FakeDynamoDB()
+    fake.cleanups = []
+    fake.manifests = {}
+    monkeypatch.setattr(storage_facilities, 'dynamodb', fake)
+    monkeypatch.setattr(storage_facilities, 'table', FakeTable({'location': 'Durban', 'type': 'Garage', 'image_key': OLD_IMAGE}))
+    monkeypatch.setattr(storage_facilities, 'meta_table', SimpleNamespace(name='meta'))
+    monkeypatch.setattr(storage_facilities, 'uploaded_image_url', lambda image_key: f"https://example.com/{image_key}")
+    monkeypatch.setattr(storage_facilities, 'image_derivatives', lambda image_key: fake.manifests.get(image_key, {}))
+    monkeypatch.setattr(storage_facilities, 'enqueue_image_cleanup', fake.cleanups.extend)
+    return fake
+
+
+def patch(body, facility_id='f-1'):
+    response = storage_facilities.update_facility(facility_id, {'body': json.dumps(body)})
+    return response['statusCode'], json.loads(response['body'])
+
+
+def written_update(dynamodb, transaction=0):
+    write, bump = dynamodb.transactions[transaction]
+    assert bump['Update']['Key'] == {'meta_id': 'catalog_version'}
+    return write['Update']
+
+
+def assignments(update):
+    """SET attribute -> value, resolved through the placeholders."""
+    names, values = update['ExpressionAttributeNames'], update['ExpressionAttributeValues']
+    sets = update['UpdateExpression'].split(' REMOVE ')[0].split(' ADD ')[0][len('SET '):]
+    return {names[name]: values[value] for name, value in (part.split(' = ') for part in sets.split(', '))}
+
+
+def test_only_supplied_fields_are_set(dynamodb):
+    status, body = patch({'price': 120, 'description': 'Dry'})
+
+    update = written_update(dynamodb)
+    assert status == 200
+    assert assignments(update) == {'price': 120, 'description': 'Dry'}
+    assert update['UpdateExpression'].endswith(' ADD #version :one')
+    assert update['ConditionExpression'] == 'attribute_exists(facility_id)'
+    assert storage_facilities.table.reads == []
+    assert body['attributes'] == {'price': 120, 'description': 'Dry'}
+
+
+def test_a_version_makes_the_update_conditional(dynamodb):
+    status, body = patch({'price': 120, 'version': 3})
+
+    update = written_update(dynamodb)
+    assert update['ConditionExpression'] == 'attribute_exists(facility_id) AND #version = :expected'
+    assert update['ExpressionAttributeValues'][':expected'] == 3
+    assert body['attributes']['version'] == 4
+
+
+def test_version_zero_also_matches_unversioned_facilities(dynamodb):
+    patch({'price': 120, 'version': 0})
+
+    assert written_update(dynamodb)['ConditionExpression'] == (
+        'attribute_exists(facility_id) AND (attribute_not_exists(#version) OR #version = :expected)')
+
+
+def test_location_type_is_derived_from_the_stored_half(dynamodb):
+    patch({'location': 'George'})
+
+    update = written_update(dynamodb)
+    assert storage_facilities.table.reads == [['type']]
+    assert assignments(update)['location_type'] == storage_facilities.location_type_key('George', 'Garage')
+    # The stored type must not change between the read and the write
+    assert update['ConditionExpression'] == 'attribute_exists(facility_id) AND #e0 = :e0'
+    assert update['ExpressionAttributeNames']['#e0'] == 'type'
+    assert update['ExpressionAttributeValues'][':e0'] == 'Garage'
+
+
+def test_changing_both_halves_needs_no_read(dynamodb):
+    patch({'location': 'George', 'type': 'Locker'})
+
+    assert storage_facilities.table.reads == []
+    assert assignments(written_update(dynamodb))['location_type'] == storage_facilities.location_type_key('George', 'Locker')
+
+
+def test_a_new_image_queues_the_old_one_for_cleanup(dynamodb):
+    status, body = patch({'image_key': NEW_IMAGE})
+
+    update = written_update(dynamodb)
+    assert assignments(update)['image_url'] == f"https://example.com/{NEW_IMAGE}"
+    assert 'REMOVE #r0, #r1' in update['UpdateExpression']
+    assert {update['ExpressionAttributeNames'][name] for name in ('#r0', '#r1')} == {'image_variants', 'thumbnail_url'}
+    # The image read must still be the stored one, or missing, when the update lands
+    assert 'attribute_not_exists(#e1)' in update['ConditionExpression']
+    assert update['ExpressionAttributeValues'][':e0'] == OLD_IMAGE
+    assert dynamodb.cleanups == [OLD_IMAGE]
+
+
+def test_keeping_the_same_image_queues_no_cleanup(dynamodb):
+    patch({'image_key': OLD_IMAGE})
+
+    assert dynamodb.cleanups == []
+
+
+def test_a_processed_image_brings_its_variants(dynamodb):
+    dynamodb.manifests[NEW_IMAGE] = VARIANTS
+
+    patch({'image_key': NEW_IMAGE})
+
+    update = written_update(dynamodb)
+    assert assignments(update)['thumbnail_url'] == VARIANTS['thumbnail_url']
+    assert ' REMOVE ' not in update['UpdateExpression']
+    assert len(dynamodb.transactions) == 1
+
+
+def test_a_missing_facility_is_404(dynamodb):
+    dynamodb.reasons = [{'Code': 'ConditionalCheckFailed'}, {'Code': 'None'}]
+
+    assert patch({'price': 1})[0] == 404
+
+
+def test_a_stale_version_is_409_with_the_current_version(dynamodb):
+    dynamodb.reasons = [{'Code': 'ConditionalCheckFailed', 'Item': {'version': {'N': '5'}}}, {'Code': 'None'}]
+
+    status, body = patch({'price': 1, 'version': 3})
+
+    assert status == 409
+    assert body['version'] == 5
+
+
+@pytest.mark.parametrize('body', [{}, {'facility_id': 'other'}, {'version': 2}, {'price': 'cheap'}, ['price']])
+def test_invalid_updates_are_400(dynamodb, body):
+    assert patch(body)[0] == 400
+    assert dynamodb.transactions == []
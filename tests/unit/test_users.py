@@ -0,0 +1,126 @@
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+import users
+
+STORED = {'userid': 'u-1', 'name': 'Thandi', 'email': 'thandi@example.com', 'city': 'Durban', 'timestamp': 't0'}
+
+
+class FakeUsersTable:
+    """Holds one user and records the updates made to it."""
+
+    def __init__(self, user):
+        self.user = user
+        self.updates = []
+        self.conflict = False
+
+    def get_item(self, Key, ConsistentRead):
+        return {'Item': dict(self.user)} if self.user and Key['userid'] == self.user['userid'] else {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression, ExpressionAttributeNames,
+                    ExpressionAttributeValues, ReturnValues):
+        if self.conflict:
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+        self.updates.append({'UpdateExpression': UpdateExpression, 'ConditionExpression': ConditionExpression,
+                             'ExpressionAttributeNames': ExpressionAttributeNames,
+                             'ExpressionAttributeValues': ExpressionAttributeValues})
+        return {'Attributes': dict(self.user, version=int(self.user.get('version', 0)) + 1)}
+
+
+@pytest.fixture()
+def table(monkeypatch):
+    table = FakeUsersTable(dict(STORED))
+    monkeypatch.setattr(users, 'ddbTable', table)
+    return table
+
+
+def put(body, userid='u-1'):
+    return users.update_user({'pathParameters': {'userid': userid}, 'body': json.dumps(body)})
+
+
+def changed(update):
+    """Profile attributes the update SETs and REMOVEs, by name."""
+    names = update['ExpressionAttributeNames']
+    expression = update['UpdateExpression'].split(' ADD ')[0]
+    sets, _, removes = expression[len('SET '):].partition(' REMOVE ')
+    assigned = {names[name]: update['ExpressionAttributeValues'][value]
+                for name, value in (part.split(' = ') for part in sets.split(', '))}
+    for managed in ('timestamp', 'content_hash'):
+        assigned.pop(managed)
+    return assigned, sorted(names[name] for name in removes.split(', ') if name)
+
+
+def test_an_update_that_changes_nothing_is_not_written(table):
+    body, status = put({'name': 'Thandi', 'city': 'Durban'})
+
+    assert status == 200
+    assert body == STORED
+    assert table.updates == []
+
+
+def test_only_changed_attributes_are_set(table):
+    body, status = put({'name': 'Thandi', 'city': 'George', 'phone': '012'})
+
+    assert status == 200
+    assert changed(table.updates[0]) == ({'city': 'George', 'phone': '012'}, [])
+
+
+def test_null_removes_an_attribute(table):
+    put({'city': None, 'nickname': None})
+
+    # Only attributes that are stored can be removed
+    assert changed(table.updates[0]) == ({}, ['city'])
+
+
+def test_managed_fields_in_the_body_are_ignored(table):
+    body, status = put({'userid': 'u-2', 'timestamp': 'forged', 'content_hash': 'forged'})
+
+    assert status == 200
+    assert table.updates == []
+
+
+def test_the_write_is_guarded_by_the_stored_version(table):
+    table.user['version'] = 3
+
+    put({'city': 'George'})
+
+    update = table.updates[0]
+    assert update['ConditionExpression'] == '#version = :expected'
+    assert update['ExpressionAttributeValues'][':expected'] == 3
+    assert update['UpdateExpression'].endswith(' ADD #version :one')
+
+
+def test_unversioned_users_must_still_be_unversioned(table):
+    put({'city': 'George'})
+
+    assert table.updates[0]['ConditionExpression'] == 'attribute_exists(userid) AND attribute_not_exists(#version)'
+
+
+def test_a_stale_version_is_409(table):
+    table.user['version'] = 3
+
+    body, status = put({'city': 'George', 'version': 2})
+
+    assert status == 409
+    assert body['version'] == 3
+    assert table.updates == []
+
+
+def test_a_concurrent_update_is_409(table):
+    table.conflict = True
+
+    assert put({'city': 'George'})[1] == 409
+
+
+def test_a_missing_user_is_404(table):
+    assert put({'city': 'George'}, userid='u-9')[1] == 404
+
+
+@pytest.mark.parametrize('version', ['3', 1.5, True])
+def test_a_non_integer_version_is_400(table, version):
+    body, status = put({'city': 'George', 'version': version})
+
+    assert status == 400
+    assert body == {'Message': 'version must be an integer'}
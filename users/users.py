@@ -1,8 +1,15 @@
 import json
 import uuid
 import os
+import decimal
+import hashlib
 import boto3
+from botocore.exceptions import ClientError
 from datetime import datetime
+from scan_engine import parallel_scan
+from http_utils import get_header, get_body, compress_response
+from json_encoder import DecimalEncoder
+from projection import parse_fields, build_projection
 
 # DynamoDB Table Setup
 USERS_TABLE = os.getenv('USERS_TABLE', None)
@@ -14,6 +21,9 @@ COGNITO_USER_POOL_ID = os.getenv('COGNITO_USER_POOL_ID', None)
 COGNITO_APP_CLIENT_ID = os.getenv('COGNITO_APP_CLIENT_ID', None)
 cognito_client = boto3.client('cognito-idp')
 
+# Attributes the service maintains itself; everything else is profile data
+MANAGED_FIELDS = ('userid', 'timestamp', 'version', 'content_hash')
+
 # Helper Functions
 
 
@@ -27,13 +37,22 @@ def create_cors_response(status_code, body):
             'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
             'Access-Control-Allow-Credentials': 'false'
         },
-        'body': json.dumps(body) if body else ''
+        'body': json.dumps(body, cls=DecimalEncoder) if body else ''
     }
 
-"""Gets all the users"""
+"""Hash of a user's profile attributes, used to skip updates that change nothing"""
+def profile_hash(user):
+    profile = {key: value for key, value in user.items() if key not in MANAGED_FIELDS}
+    return hashlib.sha256(json.dumps(profile, cls=DecimalEncoder, sort_keys=True).encode('utf-8')).hexdigest()
+
+"""Gets all the users, optionally only the attributes listed in ?fields="""
 def get_all_users(event):
-    ddb_response = ddbTable.scan(Select='ALL_ATTRIBUTES')
-    return ddb_response.get('Items', []), 200
+    try:
+        fields = parse_fields(event.get('queryStringParameters'))
+    except ValueError as e:
+        return {'Message': str(e)}, 400
+    scan_params = build_projection(fields) if fields else {'Select': 'ALL_ATTRIBUTES'}
+    return list(parallel_scan(ddbTable, **scan_params)), 200
 
 """Gets a specific user"""
 def get_user_by_id(event):
@@ -43,7 +62,7 @@ def get_user_by_id(event):
 
 """Creates a new user"""
 def create_user(event):
-    request_json = json.loads(event['body'])
+    request_json = json.loads(get_body(event))
     email = request_json['email']
     password = request_json.get('password', 'Temp@1234')  # Default temp password
     timestamp = datetime.now().isoformat()
@@ -72,7 +91,9 @@ def create_user(event):
     try:
         request_json.update({
             'timestamp': timestamp,
-            'userid': userid
+            'userid': userid,
+            'version': 1,
+            'content_hash': profile_hash(request_json)
         })
         ddbTable.put_item(Item=request_json)
     except Exception as e:
@@ -81,14 +102,72 @@ def create_user(event):
     return create_cors_response(201, request_json)
 
 
-"""Edits a specific user info"""
+"""Edits a specific user info, writing only the attributes that changed.
+A null value removes the attribute. An unchanged profile is not written at all, and a
+'version' in the body makes the update conditional on the stored version."""
 def update_user(event):
     userid = event['pathParameters']['userid']
-    request_json = json.loads(event['body'])
-    request_json['timestamp'] = datetime.now().isoformat()
-    request_json['userid'] = userid
-    ddbTable.put_item(Item=request_json)
-    return request_json, 200
+    request_json = json.loads(get_body(event), parse_float=decimal.Decimal)
+    if not isinstance(request_json, dict):
+        return {'Message': 'The body must be a JSON object'}, 400
+    expected_version = request_json.get('version')
+    if expected_version is not None and (isinstance(expected_version, bool) or not isinstance(expected_version, int)):
+        return {'Message': 'version must be an integer'}, 400
+    changes = {key: value for key, value in request_json.items() if key not in MANAGED_FIELDS}
+
+    current = ddbTable.get_item(Key={'userid': userid}, ConsistentRead=True).get('Item')
+    if current is None:
+        return {'Message': 'User not found'}, 404
+    # Users stored before versioning count as version 0
+    current_version = int(current.get('version', 0))
+    if expected_version is not None and expected_version != current_version:
+        return {'Message': 'The user was changed by someone else', 'version': current_version}, 409
+
+    updated = dict(current)
+    updated.update(changes)
+    updated = {key: value for key, value in updated.items() if value is not None}
+    content_hash = profile_hash(updated)
+    if content_hash == current.get('content_hash', profile_hash(current)):
+        return current, 200
+
+    names = {'#timestamp': 'timestamp', '#content_hash': 'content_hash', '#version': 'version'}
+    values = {':timestamp': datetime.now().isoformat(), ':content_hash': content_hash, ':one': 1}
+    assignments = ['#timestamp = :timestamp', '#content_hash = :content_hash']
+    removals = []
+    for index, (key, value) in enumerate(changes.items()):
+        if value is None:
+            if key in current:
+                names[f"#a{index}"] = key
+                removals.append(f"#a{index}")
+        elif current.get(key) != value:
+            names[f"#a{index}"] = key
+            values[f":a{index}"] = value
+            assignments.append(f"#a{index} = :a{index}")
+    update_expression = 'SET ' + ', '.join(assignments)
+    if removals:
+        update_expression += ' REMOVE ' + ', '.join(removals)
+    update_expression += ' ADD #version :one'
+
+    # Guard the read-modify-write against a concurrent update
+    if current_version:
+        condition = '#version = :expected'
+        values[':expected'] = current_version
+    else:
+        condition = 'attribute_exists(userid) AND attribute_not_exists(#version)'
+    try:
+        response = ddbTable.update_item(
+            Key={'userid': userid},
+            UpdateExpression=update_expression,
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+            ReturnValues='ALL_NEW'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return {'Message': 'The user was changed by someone else'}, 409
+    return response['Attributes'], 200
 
 """Deletes a specific user"""
 def delete_user(event):
@@ -120,6 +199,7 @@ def lambda_handler(event, context):
         # Handle exceptions
         response_body, status_code = {'Error': str(err)}, 500
 
-    # Return the response with CORS headers
-    return create_cors_response(status_code, response_body)
+    # Return the response with CORS headers, compressed if the client accepts it
+    response = create_cors_response(status_code, response_body)
+    return compress_response(response, get_header(event, 'Accept-Encoding'), get_header(event, 'Accept'))
 